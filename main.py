@@ -2,22 +2,52 @@
 
 import argparse
 import ctypes
+import io
 import json
+import math
 import os
+import selectors
+import shutil
+import struct
+import subprocess
+import sys
 import threading
 import time
 import warnings
+import zlib
 from abc import ABC, abstractmethod
-from multiprocessing import Process, Queue, Value
-from queue import Empty
-from typing import Any, Dict, List, Tuple
+from array import array
+from concurrent.futures import Future, ThreadPoolExecutor
+from multiprocessing import Process, Semaphore
+from multiprocessing.shared_memory import SharedMemory
+from multiprocessing.sharedctypes import RawArray, RawValue
+from queue import Empty, Full
+from queue import Queue as ThreadQueue
+from typing import Any, Callable, Dict, List, Tuple
 
 import mss
-import mss.tools
-from inputs import UnpluggedError, devices, get_gamepad
-from PIL import Image
+from inputs import EVENT_FORMAT, EVENT_SIZE, NIX, UnpluggedError, devices, get_gamepad
+from PIL import Image, features
 from pynput import keyboard, mouse
 
+try:
+    # Optional: DXGI Desktop Duplication capture on Windows
+    import dxcam  # type: ignore[import-not-found]
+except ImportError:
+    dxcam = None
+
+try:
+    # Optional: faster DEFLATE for the PNG screenshots, with the same API as zlib
+    from zlib_ng import zlib_ng as png_zlib  # type: ignore[import-not-found]
+except ImportError:
+    png_zlib = zlib  # type: ignore[misc]
+
+try:
+    # Optional: faster serialization of the input logs
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore[assignment]
+
 
 def colorful_warning(message, category, filename, lineno, line=None) -> str:
     # ANSI escape codes for colors
@@ -33,142 +63,831 @@ def colorful_warning(message, category, filename, lineno, line=None) -> str:
 # Override the default warning format
 warnings.formatwarning = colorful_warning
 
+# On free-threaded builds (python3.13t run with the GIL disabled), threads run Python code in parallel: the
+# grabbing and saving workers are started as threads of the main process instead of processes.
+GIL_DISABLED = not getattr(sys, "_is_gil_enabled", lambda: True)()
+
+# Negative entries are screenshots identical to the previous one: DUPLICATE_BASE - number
+DUPLICATE_BASE = -1
+
+# The grabbing sleeps until this long before a deadline then spins on the clock: sleeps overshoot by
+# tens of microseconds on Linux and up to a millisecond on Windows
+SPIN_NS = 200_000
+
+
+# Alignment of the shared memory slots: a page, so no frame shares a page with its neighbours
+SLOT_ALIGNMENT = 4096
+
+
+def _slot_bytes(frame_bytes: int) -> int:
+    """Size of a shared memory slot holding a frame of `frame_bytes`, rounded up to SLOT_ALIGNMENT."""
+    return -(-frame_bytes // SLOT_ALIGNMENT) * SLOT_ALIGNMENT
+
+
+# ffmpeg encoder options for the mp4 format. The NVENC encoders run on NVIDIA GPUs and leave the CPU free.
+# Other encoders are used with ffmpeg's default options.
+VIDEO_CODEC_OPTIONS: Dict[str, List[str]] = {
+    "libx264rgb": ["-crf", "18", "-preset", "ultrafast"],
+    "libx264": ["-crf", "18", "-preset", "ultrafast", "-pix_fmt", "yuv420p"],
+    "h264_nvenc": ["-preset", "p1", "-rc", "vbr", "-cq", "19"],
+    "hevc_nvenc": ["-preset", "p1", "-rc", "vbr", "-cq", "19"],
+}
+
+
+# Stream files written instead of one file per screenshot: STREAM_MAGIC and the image format padded to
+# 8 bytes, then for each screenshot its number, the size of its encoding and the encoding. A size of 0
+# means the screenshot is identical to the previous one of the stream.
+STREAM_MAGIC = b"SCRSTRM1"
+STREAM_RECORD = struct.Struct("<qI")
+
+
+# Flags to create or truncate a file for writing raw bytes. O_BINARY only exists on Windows.
+WRITE_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0)
+
+
+# Scanline buffers reused by each encoding thread, see _encode_png
+_png_buffers = threading.local()
+
+
+def _encode_png(rgb: bytes, size: tuple[int, int], level: int) -> list[bytes]:
+    """Encode RGB pixels to PNG without filtering, like mss.tools.to_png.
+
+    The scanlines, each prefixed by its filter byte, are copied into a buffer kept by the calling thread
+    instead of being joined from new bytes objects for each screenshot. The DEFLATE compression uses
+    zlib-ng when it is installed. The PNG is returned in 3 parts, the compressed data in the middle, so
+    it is written without joining them.
+    """
+    width, height = size
+    line = width * 3
+    n_bytes = (line + 1) * height
+    scanlines = getattr(_png_buffers, "scanlines", None)
+    if scanlines is None or len(scanlines) != n_bytes:
+        # The filter bytes stay 0 (no filter): only the pixels are written afterwards
+        scanlines = _png_buffers.scanlines = bytearray(n_bytes)
+    pixels = memoryview(rgb)
+    for y in range(height):
+        start = y * (line + 1) + 1
+        scanlines[start : start + line] = pixels[y * line : y * line + line]
+    idat = png_zlib.compress(scanlines, level)
+    ihdr = b"IHDR" + struct.pack(">2I5B", width, height, 8, 2, 0, 0, 0)
+    head = b"".join(
+        (
+            b"\x89PNG\r\n\x1a\n",
+            struct.pack(">I", len(ihdr) - 4),
+            ihdr,
+            struct.pack(">I", zlib.crc32(ihdr)),
+            struct.pack(">I", len(idat)),
+            b"IDAT",
+        )
+    )
+    tail = b"".join(
+        (
+            struct.pack(">I", zlib.crc32(idat, zlib.crc32(b"IDAT"))),
+            struct.pack(">I", 0),
+            b"IEND",
+            struct.pack(">I", zlib.crc32(b"IEND")),
+        )
+    )
+    return [head, idat, tail]
+
+
+def _attach_shm(name: str) -> SharedMemory:
+    """Open another handle on the shared memory `name` of the current process, without tracking it twice."""
+    if sys.version_info >= (3, 13):
+        return SharedMemory(name=name, track=False)
+    return SharedMemory(name=name)
+
+
+def _write_file(path: str, parts: list[bytes]) -> None:
+    """Write the parts of a file with raw system calls, without Python's buffered file object.
+
+    The parts are gathered in a single writev call where it exists, without joining them first.
+    """
+    fd = os.open(path, WRITE_FLAGS, 0o644)
+    try:
+        written = os.writev(fd, parts) if hasattr(os, "writev") else 0
+        for part in parts:
+            if written >= len(part):
+                written -= len(part)
+                continue
+            # Partial writev or no writev: write the rest of the parts one by one
+            view = memoryview(part)[written:]
+            written = 0
+            while view:
+                view = view[os.write(fd, view) :]
+    finally:
+        os.close(fd)
+
+
+def _raise_grab_priority() -> None:
+    """Best effort to make the sleeps of the current process wake up on time.
+
+    On Linux, the process gets the lowest real-time priority, which is only allowed with CAP_SYS_NICE, so it
+    is not queued behind the encoders when a deadline expires. Nothing is needed on Windows: since Python
+    3.11, time.sleep uses a high resolution waitable timer instead of the 15.6 ms system timer.
+    """
+    if sys.platform == "linux":
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(1))
+        except OSError:
+            # Not permitted: keep the default scheduling
+            pass
+
+
+def _available_cpus() -> List[int]:
+    """CPUs the current process may run on."""
+    if sys.platform == "linux":
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def _pin_to_cpus(pid: int, cpus: List[int]) -> None:
+    """Best effort to keep the process `pid` on the given CPUs. Only supported on Linux and Windows."""
+    if sys.platform == "linux":
+        try:
+            os.sched_setaffinity(pid, cpus)
+        except OSError as e:
+            warnings.warn(
+                f"WARNING: Could not pin process {pid} to CPUs {cpus}: {e}", RuntimeWarning
+            )
+    elif sys.platform == "win32":
+        kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        kernel32.OpenProcess.restype = ctypes.c_void_p
+        # PROCESS_SET_INFORMATION | PROCESS_QUERY_INFORMATION
+        handle = kernel32.OpenProcess(0x0200 | 0x0400, False, pid)
+        if not handle or not kernel32.SetProcessAffinityMask(
+            ctypes.c_void_p(handle), ctypes.c_size_t(sum(1 << cpu for cpu in cpus))
+        ):
+            warnings.warn(
+                f"WARNING: Could not pin process {pid} to CPUs {cpus}: error {ctypes.get_last_error()}",
+                RuntimeWarning,
+            )
+        if handle:
+            kernel32.CloseHandle(ctypes.c_void_p(handle))
+    else:
+        warnings.warn("WARNING: Pinning processes to CPUs is not supported on this platform.")
+
+
+def _dump_json(logs: List[Dict[str, Any]], path: str) -> None:
+    """Write the logs to a JSON file. Uses orjson when installed, json otherwise."""
+    if orjson is not None:
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(logs))
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(logs, f)
+
+
+class GrabStats(ctypes.Structure):
+    """Statistics written by the grabbing process into shared memory. `done` is set last."""
+
+    _fields_ = [
+        ("fps", ctypes.c_double),
+        ("time", ctypes.c_double),
+        ("max_stable_fps", ctypes.c_int64),
+        ("dropped", ctypes.c_int64),
+        ("missed", ctypes.c_int64),
+        ("n_screenshots", ctypes.c_int64),
+        ("epoch_ns", ctypes.c_int64),
+        ("done", ctypes.c_bool),
+    ]
+
+
+class SaveStats(ctypes.Structure):
+    """Statistics written by a saving process into shared memory. `done` is set last."""
+
+    _fields_ = [
+        ("fps", ctypes.c_double),
+        ("time", ctypes.c_double),
+        ("done", ctypes.c_bool),
+    ]
+
+
+class SPSCRing:
+    """Single producer single consumer ring of slot indices shared between processes.
+
+    The entries and counters live in shared ctypes arrays, so nothing is pickled and no feeder thread or lock
+    is involved. Each counter has a single writer. The two semaphores wake up the other side and order the
+    entry writes with the counter updates. The producer closes the ring instead of sending a sentinel entry:
+    the consumer gets EOFError once the remaining entries are read.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self._entries = RawArray(ctypes.c_int64, capacity)
+        # Head (index 0) and tail (index 8) are 64 bytes apart to stay on separate cache lines.
+        self._counters = RawArray(ctypes.c_int64, 16)
+        self._items = Semaphore(0)
+        self._spaces = Semaphore(capacity)
+
+    def put(self, index: int, block: bool = True, timeout: float | None = None) -> None:
+        """Push a slot index. Only called by the producer. Raises Full if there is no space in time."""
+        if not self._spaces.acquire(block, timeout):
+            raise Full
+        head = self._counters[0]
+        self._entries[head % self.capacity] = index
+        self._counters[0] = head + 1
+        self._items.release()
+
+    def close(self) -> None:
+        """Tell the consumer that no more entries will be pushed. Only called by the producer.
+
+        The extra wake-up finds the ring empty once every entry is read, which is how get detects the end.
+        """
+        self._items.release()
+
+    def get(self, block: bool = True, timeout: float | None = None) -> int:
+        """Pop a slot index. Only called by the consumer. Raises EOFError once the ring is closed and empty."""
+        if not self._items.acquire(block, timeout):
+            raise Empty
+        tail = self._counters[8]
+        if tail == self._counters[0]:
+            # Woken up by close: keep the wake-up for the next calls
+            self._items.release()
+            raise EOFError
+        index = self._entries[tail % self.capacity]
+        self._counters[8] = tail + 1
+        self._spaces.release()
+        return index
+
+    def get_nowait(self) -> int:
+        return self.get(block=False)
+
+    def qsize(self) -> int:
+        return self._counters[0] - self._counters[8]
+
+    def full(self) -> bool:
+        return self.qsize() >= self.capacity
+
 
 def _grab(
-    queues: list[Queue],
-    _out_queue: Queue,
+    queues: list[SPSCRing],
+    free_queues: list[SPSCRing],
+    shm: SharedMemory,
+    rect: Dict[str, int],
+    timestamps_ns: ctypes.Array,
+    stats: GrabStats,
     stop_flag: ctypes.c_bool,
     aimed_fps: int,
     max_screenshots: int = 100_000,
+    backend: str = "mss",
+    drop_on_backpressure: bool = False,
+    deduplicate: bool = False,
     verbose: bool = False,
 ) -> None:
-    """Process that take screenshots at desired FPS and send them to the queues.
+    """Process that take screenshots at desired FPS and write them to the shared memory slots.
+
+    Each saving process owns an equal share of the slots of `shm`. A screenshot is given to the saving
+    process with the most free slots: it is copied into one of its free slots and only the
+    slot index, packed with the screenshot number, is sent through the queue.
 
     Args:
-        queues (list[Queue]): Queues to send the screenshots to give to the saving processes.
-        _out_queue (Queue): Queue to send the logs to at the end.
+        queues (list[SPSCRing]): Rings to send the slot indices to give to the saving processes.
+        free_queues (list[SPSCRing]): Rings to receive the slot indices released by the saving processes.
+        shm (SharedMemory): Shared memory holding the slots of raw BGRA screenshots.
+        rect (Dict[str, int]): Top, left, width and height of the monitor to capture.
+        timestamps_ns (ctypes.Array): Shared array of `max_screenshots` int64 where the capture time of each
+            saved screenshot is written, in nanoseconds since the epoch sent in the logs.
+        stats (GrabStats): Shared statistics to fill at the end.
         stop_flag (ctypes.c_bool): Flag to stop the process from the main process.
         aimed_fps (int): Desired FPS for the screenshots.
         max_screenshots (int, optional): Maximum number of screenshots before stopping. Defaults to 100_000.
+        backend (str, optional): Capture backend, "mss" or "dxgi". Defaults to "mss".
+        drop_on_backpressure (bool, optional): Skip the screenshot instead of waiting when every slot of the
+            saving processes is in use. Defaults to False.
+        deduplicate (bool, optional): Compare each screenshot to the previous one and, when they are identical,
+            only send its number so the saving process links the previous file. Defaults to False.
         verbose (bool, optional): Control how much information is printed. Useful for debugging. Defaults to False.
     """
-    sct = mss.mss()
-    all_timestamps = []
     monitor_id = 1
-    rect = {
-        "top": sct.monitors[monitor_id]["top"],
-        "left": sct.monitors[monitor_id]["left"],
-        "width": sct.monitors[monitor_id]["width"],
-        "height": sct.monitors[monitor_id]["height"],
-    }
-    start_time = time.time()
-    grab_time = time.perf_counter()
+    if backend == "dxgi":
+        # Frames come from the DXGI Desktop Duplication API, already in BGRA.
+        # video_mode repeats the last frame when the screen is static to keep the cadence.
+        camera = dxcam.create(output_idx=monitor_id - 1, output_color="BGRA")
+        camera.start(target_fps=aimed_fps, video_mode=True)
+        # The slots are sized from the monitor of mss. With DPI scaling or a rotated screen, the frames of
+        # DXGI can have another size: they would not fit the slots.
+        height, width = camera.get_latest_frame().shape[:2]
+        if (width, height) != (rect["width"], rect["height"]):
+            warnings.warn(
+                f"WARNING: DXGI frames are {width}x{height} instead of {rect['width']}x{rect['height']}. "
+                + "Falling back to the mss backend.",
+                RuntimeWarning,
+            )
+            camera.stop()
+            backend = "mss"
+    if backend == "dxgi":
+
+        def grab_raw() -> memoryview | bytearray:
+            return memoryview(camera.get_latest_frame()).cast("B")
+    else:
+        sct = mss.mss()
+        grab = sct.grab
+        # The rect dict is passed as is: mss turns bbox tuples into a new dict on every grab
+
+        def grab_raw() -> memoryview | bytearray:
+            return grab(rect).raw
+
+    slots = shm.buf
+    assert slots is not None, "Shared memory is closed."
+    frame_bytes = rect["width"] * rect["height"] * 4
+    slot_bytes = _slot_bytes(frame_bytes)
+    # Ring entries carry the screenshot number along with the slot: number * total_slots + slot
+    total_slots = shm.size // slot_bytes
+    n_slots = total_slots // len(queues)
+    # Free slots of each saving process. Used as a stack so recently released slots,
+    # already in memory, are reused first.
+    free_slots = [list(reversed(range(k * n_slots, (k + 1) * n_slots))) for k in range(len(queues))]
+    _raise_grab_priority()
+    # Wall clock epoch of the recording. Every other time is read from the monotonic clock.
+    epoch_ns = time.time_ns()
+    start_ns = time.perf_counter_ns()
+    grab_time_ns = start_ns
+    frame_ns = 1_000_000_000 / aimed_fps
+    # Deadline of the next grab, on a fixed schedule from start_ns
+    next_ns = start_ns + frame_ns
+    # Frame periods skipped because a grab overran its deadline by more than a period
+    missed = 0
     max_stable_fps = 10_000
+    # Local names for the calls of the loop
+    perf_counter_ns = time.perf_counter_ns
+    sleep = time.sleep
+    n_queues = len(queues)
+    queue_ids = range(n_queues)
+    # Number of the next screenshot saved. Dropped screenshots don't take a number,
+    # so the files and the timestamps stay contiguous.
+    number = 0
+    dropped = 0
+    # Last saved screenshot and the saving process it was given to, to detect duplicates
+    previous = bytearray(frame_bytes if deduplicate else 0)
+    previous_k = -1
+
+    def put_until_stopped(queue: SPSCRing, entry: int) -> bool:
+        """Push an entry, waiting for space unless the recording is stopped. Returns whether it was pushed.
+
+        The stop flag is checked while waiting so a saving process that died doesn't block the grabbing forever.
+        """
+        while not stop_flag.value:
+            try:
+                queue.put(entry, timeout=0.1)
+                return True
+            except Full:
+                pass
+        return False
+
     for i in range(max_screenshots):
         if stop_flag.value:
             break
-        queue = queues[i % len(queues)]
-        queue.put(sct.grab(rect))
-        all_timestamps.append(time.time())
-        time.sleep(max(0, 1 / aimed_fps - (time.perf_counter() - grab_time)))
-        max_stable_fps = min(max_stable_fps, int(1 / (time.perf_counter() - grab_time)))
-        grab_time = time.perf_counter()
+        numbered = number
+        raw = grab_raw() if deduplicate else None
+        if raw is not None and previous_k >= 0 and raw == previous:
+            # Same as the previous screenshot: the saving process that has it links its file
+            try:
+                if drop_on_backpressure:
+                    queues[previous_k].put(DUPLICATE_BASE - number, block=False)
+                elif not put_until_stopped(queues[previous_k], DUPLICATE_BASE - number):
+                    break
+                number += 1
+            except Full:
+                dropped += 1
+        else:
+            # Saving process with the most free slots, counting the released ones not received yet.
+            # Duplicate tokens in its ring use no slot, so the ring length is not its load.
+            # Ties go round robin so idle processes share the work.
+            k = min(
+                queue_ids,
+                key=lambda j: (-len(free_slots[j]) - free_queues[j].qsize(), (j - i) % n_queues),
+            )
+            while "slots are released":
+                try:
+                    free_slots[k].append(free_queues[k].get_nowait())
+                except Empty:
+                    break
+            if not free_slots[k] and drop_on_backpressure:
+                # Every saving process is busy: skip this screenshot to keep the cadence
+                dropped += 1
+            else:
+                # Wait for the saving process to release a slot, unless the recording is stopped
+                while not free_slots[k] and not stop_flag.value:
+                    try:
+                        free_slots[k].append(free_queues[k].get(timeout=0.1))
+                    except Empty:
+                        pass
+                if not free_slots[k]:
+                    break
+                slot = free_slots[k].pop()
+                if raw is None:
+                    raw = grab_raw()
+                slots[slot * slot_bytes : slot * slot_bytes + frame_bytes] = raw
+                if not put_until_stopped(queues[k], number * total_slots + slot):
+                    break
+                number += 1
+                if deduplicate:
+                    previous[:] = raw
+                    previous_k = k
+        if number > numbered:
+            now_ns = perf_counter_ns()
+            # Capture time from the monotonic clock, relative to start_ns
+            timestamps_ns[number - 1] = now_ns - start_ns
+            # FPS reachable with the cost of this frame alone, without the waiting
+            max_stable_fps = min(max_stable_fps, int(1e9 / (now_ns - grab_time_ns)))
+        # Sleep until the absolute deadline of the next frame so sleep errors don't accumulate
+        now_ns = perf_counter_ns()
+        if now_ns - next_ns > frame_ns:
+            # Late by more than a frame: restart the schedule instead of catching up with a burst
+            missed += int((now_ns - next_ns) // frame_ns)
+            next_ns = now_ns
+        elif now_ns < next_ns:
+            if next_ns - now_ns > SPIN_NS:
+                sleep((next_ns - SPIN_NS - now_ns) / 1e9)
+            while perf_counter_ns() < next_ns:
+                pass
+        next_ns += frame_ns
+        grab_time_ns = perf_counter_ns()
+    if backend == "dxgi":
+        camera.stop()
+    else:
+        # Release the display handles (GDI device contexts on Windows), the worker may be a thread
+        sct.close()
     if verbose:
-        print("Stop screenshotting. Give empty image to saving workers to stop.")
+        print("Stop screenshotting. Close the rings to stop the saving workers.")
     # Tell the other worker to stop
     for queue in queues:
-        queue.put(None)
-    out_log = {
-        "log": "grabbing",
-        "fps": len(all_timestamps) / (time.time() - start_time),
-        "time": time.time() - start_time,
-        "max_stable_fps": max_stable_fps,
-        "timestamps": all_timestamps,
-    }
-    _out_queue.put(out_log)
+        queue.close()
+    elapsed = (time.perf_counter_ns() - start_ns) / 1e9
+    stats.fps = number / elapsed
+    stats.time = elapsed
+    stats.max_stable_fps = max_stable_fps
+    stats.dropped = dropped
+    stats.missed = missed
+    # The timestamps stay in shared memory: only their number and epoch are needed
+    stats.n_screenshots = number
+    stats.epoch_ns = epoch_ns
+    stats.done = True
+    shm.close()
     if verbose:
         print("Grabbing worker finished and output logs.")
 
 
+def _make_encoder(
+    format_image: str,
+    compression_rate: int,
+    quality: int,
+    downsample: int,
+    webp_method: int = 0,
+    quantize: bool = False,
+) -> Callable[[Image.Image], list[bytes]]:
+    """Pick the function encoding the screenshots once: the format is fixed for the whole recording.
+
+    Args:
+        format_image (str): Format to save the screenshots to ("png", "jpg" or "webp").
+        compression_rate (int): Compression rate for the screenshots. Only applies to PNG format.
+        quality (int): Quality for the screenshots. Only applies to JPG and WEBP formats.
+        downsample (int): Downsample factor for the screenshots.
+        webp_method (int, optional): Speed of the WEBP encoder. Defaults to 0.
+        quantize (bool, optional): Save palette PNGs of 256 colors. Defaults to False.
+
+    Returns:
+        Callable[[Image.Image], list[bytes]]: Function encoding a RGB screenshot in memory, returning the
+            parts of the file.
+    """
+    pil_formats: dict[str, tuple[str, dict[str, int]]] = {
+        "png": ("PNG", {"compress_level": compression_rate}),
+        "jpg": ("JPEG", {"quality": quality}),
+        "webp": ("WEBP", {"quality": quality, "method": webp_method}),
+    }
+    if format_image not in pil_formats:
+        raise ValueError(f"Invalid format: {format_image}")
+    pil_format, save_options = pil_formats[format_image]
+    # libimagequant gives better palettes when Pillow is built with it, the octree is faster
+    quantize_method = (
+        Image.Quantize.LIBIMAGEQUANT
+        if features.check("libimagequant")
+        else Image.Quantize.FASTOCTREE
+    )
+
+    def encode_png(img_pil: Image.Image) -> list[bytes]:
+        """Encode the screenshot to PNG without filtering, faster than Pillow."""
+        return _encode_png(img_pil.tobytes(), img_pil.size, compression_rate)
+
+    def encode_pil(img_pil: Image.Image) -> list[bytes]:
+        """Encode the screenshot in memory with Pillow."""
+        buffer = io.BytesIO()
+        img_pil.save(buffer, pil_format, **save_options)
+        return [buffer.getvalue()]
+
+    def encode_quantized(img_pil: Image.Image) -> list[bytes]:
+        """Reduce the screenshot to a palette of 256 colors and encode it to PNG with Pillow."""
+        buffer = io.BytesIO()
+        img_pil.quantize(256, method=quantize_method).save(
+            buffer, "PNG", compress_level=compression_rate
+        )
+        return [buffer.getvalue()]
+
+    def encode_downsampled(img_pil: Image.Image) -> list[bytes]:
+        """Downsample the screenshot by averaging blocks of `downsample` x `downsample` pixels, then encode it."""
+        return encode_full(img_pil.reduce(downsample))
+
+    encode_full = encode_png if format_image == "png" else encode_pil
+    if quantize and format_image == "png":
+        encode_full = encode_quantized
+    return encode_full if downsample == 1 else encode_downsampled
+
+
 def _save(
-    queue: Queue,
-    _out_queue: Queue,
+    queue: SPSCRing,
+    free_queue: SPSCRing,
+    shm: SharedMemory,
+    size: tuple[int, int],
+    stats: SaveStats,
     path_output: str,
     compression_rate: int,
     quality: int,
     downsample: int,
     process_id: int,
-    n_processes: int,
     format_image: str,
+    n_threads: int = 1,
+    stream: bool = False,
+    webp_method: int = 0,
+    quantize: bool = False,
     verbose: bool = False,
 ) -> None:
     """Process that saves the screenshots to the disk.
+
+    The screenshots are encoded by a pool of `n_threads` threads: zlib, libjpeg and libwebp release the GIL
+    while encoding, so threads encode in parallel without any inter-process communication.
+
     Args:
-        queue (Queue): Queue to get the screenshots from.
-        _out_queue (Queue): Queue to send the logs to at the end.
+        queue (SPSCRing): Ring to get the slot indices of the screenshots from.
+        free_queue (SPSCRing): Ring to release the slot indices once the screenshots are read.
+        shm (SharedMemory): Shared memory holding the slots of raw BGRA screenshots.
+        size (tuple[int, int]): Width and height of the screenshots.
+        stats (SaveStats): Shared statistics to fill at the end.
         path_output (str): Path to save the screenshots to.
         compression_rate (int): Compression rate for the screenshots. Only applies to PNG format.
         quality (int): Quality for the screenshots. Only applies to JPG and WEBP formats.
         downsample (int): Downsample factor for the screenshots.
         process_id (int): ID of the process.
-        n_processes (int): Number of processes.
         format_image (str): Format to save the screenshots to. Use Pillow's available formats(eg: "png", "jpg", "webp").
+        n_threads (int, optional): Number of encoding threads. Defaults to 1.
+        stream (bool, optional): Append the screenshots to a single stream file per process instead of
+            writing one file per screenshot. Defaults to False.
+        webp_method (int, optional): Speed of the WEBP encoder, from 0 (fastest) to 6 (smallest files).
+            Defaults to 0.
+        quantize (bool, optional): Reduce the screenshots to 256 colors and save them as palette PNGs.
+            Only applies to PNG format. Defaults to False.
         verbose (bool, optional): Control how much information is printed. Useful for debugging. Defaults to False.
     """
 
-    def save_to_disk(img: mss.screenshot.ScreenShot, number: int) -> None:
-        """Save the screenshot to the disk."""
-        output = path_output + f"file_{number * n_processes + process_id}." + format_image
-        if format_image == "png" and downsample == 1:
-            mss.tools.to_png(img.rgb, img.size, level=compression_rate, output=output)
-        elif format_image == "png" and downsample != 1:
-            img_pil = Image.frombytes("RGB", img.size, img.rgb)
-            img_pil.thumbnail(
-                (img.size[0] // downsample, img.size[1] // downsample),
-                Image.Resampling.LANCZOS,
-            )
-            img_pil.save(output, "PNG", compress_level=compression_rate)
-        elif format_image == "jpg":
-            img_pil = Image.frombytes("RGB", img.size, img.rgb)
-            img_pil.thumbnail(
-                (img.size[0] // downsample, img.size[1] // downsample),
-                Image.Resampling.LANCZOS,
-            )
-            img_pil.save(output, "JPEG", quality=quality)
-        elif format_image == "webp":
-            img_pil = Image.frombytes("RGB", img.size, img.rgb)
-            img_pil.thumbnail(
-                (img.size[0] // downsample, img.size[1] // downsample),
-                Image.Resampling.LANCZOS,
+    def to_pil(raw: memoryview) -> Image.Image:
+        """Convert the raw BGRA screenshot to a RGB Pillow image without going through `img.rgb`.
+
+        The conversion reads the slot directly and copies the pixels into the image, so the slot
+        can be released as soon as it returns.
+        """
+        return Image.frombuffer("RGB", size, raw, "raw", "BGRX", 0, 1)  # type: ignore[arg-type]
+
+    def encoded(frame: int, encoding: Future[list[bytes]]) -> list[bytes] | None:
+        """Wait for the encoding of a screenshot. Returns None and warns if it failed."""
+        try:
+            return encoding.result()
+        except Exception as e:
+            warnings.warn(
+                f"WARNING: Saving worker {process_id} failed to encode {path_template % frame}: {e}",
+                RuntimeWarning,
             )
-            img_pil.save(output, "WEBP", quality=quality)
-        else:
-            raise ValueError(f"Invalid format: {format_image}")
+            return None
 
+    def write_to_disk() -> None:
+        """Thread that writes the encoded screenshots so encoding is never blocked by the disk.
+
+        A screenshot that comes with the same encoding as the previous one is a duplicate: it is
+        hard linked to the previous file, and written again only if linking fails.
+        """
+        previous_output: str | None = None
+        previous_encoding: Future[list[bytes]] | None = None
+        while (item := writes.get()) is not None:
+            frame, encoding = item
+            output = path_template % frame
+            if encoding is previous_encoding and previous_output is not None:
+                try:
+                    os.link(previous_output, output)
+                    continue
+                except OSError:
+                    pass
+            data = encoded(frame, encoding)
+            if data is None:
+                continue
+            try:
+                _write_file(output, data)
+            except OSError as e:
+                warnings.warn(f"WARNING: Saving worker {process_id} failed to write {output}: {e}")
+                continue
+            # Only a written file is linked by the duplicates: after a failure they are written again
+            previous_output = output
+            previous_encoding = encoding
+
+    def write_to_stream() -> None:
+        """Thread that appends the encoded screenshots to the stream file of this process.
+
+        A screenshot that comes with the same encoding as the previous one is written as an empty record.
+        """
+        previous_encoding: Future[list[bytes]] | None = None
+        path_stream = path_output + f"stream_{process_id}.bin"
+        try:
+            with open(path_stream, "wb", buffering=1 << 20) as f:
+                f.write(STREAM_MAGIC + format_image.encode().ljust(8, b"\0"))
+                while (item := writes.get()) is not None:
+                    frame, encoding = item
+                    if encoding is previous_encoding:
+                        f.write(STREAM_RECORD.pack(frame, 0))
+                        continue
+                    data = encoded(frame, encoding)
+                    if data is None:
+                        continue
+                    previous_encoding = encoding
+                    f.write(STREAM_RECORD.pack(frame, sum(map(len, data))))
+                    f.writelines(data)
+        except OSError as e:
+            warnings.warn(f"WARNING: Saving worker {process_id} failed to write {path_stream}: {e}")
+            # Keep consuming so the saving loop is not blocked
+            while writes.get() is not None:
+                pass
+
+    encode = _make_encoder(
+        format_image, compression_rate, quality, downsample, webp_method, quantize
+    )
+    path_template = path_output + "file_%d." + format_image
+
+    # Encoded screenshots waiting to be written. Bounded to cap the memory used when the disk is slow.
+    writes: ThreadQueue[tuple[int, Future[list[bytes]]] | None] = ThreadQueue(maxsize=32)
+    writer = threading.Thread(target=write_to_stream if stream else write_to_disk)
+    writer.start()
+    encoder = ThreadPoolExecutor(max_workers=n_threads)
+    # Bounds the converted screenshots waiting for an encoding thread
+    pending_encodes = threading.BoundedSemaphore(2 * n_threads)
+
+    def release_encode(_: Future[list[bytes]]) -> None:
+        """Callback run once a screenshot is encoded. Defined once rather than a lambda per screenshot."""
+        pending_encodes.release()
+
+    slots = shm.buf
+    assert slots is not None, "Shared memory is closed."
+    frame_bytes = size[0] * size[1] * 4
+    slot_bytes = _slot_bytes(frame_bytes)
+    total_slots = shm.size // slot_bytes
+    # Encoding of the last screenshot, reused for its duplicates
+    encoding: Future[list[bytes]] | None = None
     number = 0
     start_time = time.time()
     while "there are screenshots":
         try:
-            img: mss.screenshot.ScreenShot | None = queue.get(timeout=60)
+            entry = queue.get(timeout=60)
         except Empty:
             warnings.warn(
                 f"WARNING: Saving worker {process_id} queue is empty. Did the grabbing process stop?",
                 RuntimeWarning,
             )
             break
-        if img is None:
+        except EOFError:
             break
-        save_to_disk(img, number)
+        if entry < 0:
+            # Same as the previous screenshot of this process: the writer links its file
+            assert encoding is not None, "A duplicate follows a screenshot."
+            writes.put((DUPLICATE_BASE - entry, encoding))
+            number += 1
+            continue
+        frame, slot = divmod(entry, total_slots)
+        img_pil = to_pil(slots[slot * slot_bytes : slot * slot_bytes + frame_bytes])
+        free_queue.put(slot)
+        pending_encodes.acquire()
+        encoding = encoder.submit(encode, img_pil)
+        encoding.add_done_callback(release_encode)
+        writes.put((frame, encoding))
         number += 1
+    # Wait for the pending encodings and writes
+    writes.put(None)
+    writer.join()
+    encoder.shutdown()
     if verbose:
         print(f"Saving worker {process_id} finished and creating logs.")
-    out_log = {
-        "log": "saving",
-        "id": process_id,
-        "fps": number / (time.time() - start_time),
-        "time": time.time() - start_time,
-    }
-    _out_queue.put(out_log)
+    elapsed = time.time() - start_time
+    stats.fps = number / elapsed
+    stats.time = elapsed
+    stats.done = True
+    shm.close()
+    if verbose:
+        print(f"Saving worker {process_id} sending logs to main process.")
+
+
+def _save_video(
+    queue: SPSCRing,
+    free_queue: SPSCRing,
+    shm: SharedMemory,
+    size: tuple[int, int],
+    stats: SaveStats,
+    path_output: str,
+    aimed_fps: int,
+    downsample: int,
+    process_id: int,
+    video_codec: str = "libx264rgb",
+    verbose: bool = False,
+) -> None:
+    """Process that pipes the raw BGRA screenshots to ffmpeg to save them as a single video.
+
+    The screenshots are written to ffmpeg straight from the shared memory slots, without any
+    conversion or per-frame file. The frames must arrive in order, so only one such process is used.
+
+    Args:
+        queue (SPSCRing): Ring to get the slot indices of the screenshots from.
+        free_queue (SPSCRing): Ring to release the slot indices once the screenshots are read.
+        shm (SharedMemory): Shared memory holding the slots of raw BGRA screenshots.
+        size (tuple[int, int]): Width and height of the screenshots.
+        stats (SaveStats): Shared statistics to fill at the end.
+        path_output (str): Path to save the video to.
+        aimed_fps (int): Frame rate of the video.
+        downsample (int): Downsample factor for the video.
+        process_id (int): ID of the process.
+        video_codec (str, optional): ffmpeg encoder of the video. Defaults to "libx264rgb".
+        verbose (bool, optional): Control how much information is printed. Useful for debugging. Defaults to False.
+    """
+    command = [
+        "ffmpeg",
+        "-y",
+        "-loglevel",
+        "error",
+        "-f",
+        "rawvideo",
+        "-pix_fmt",
+        "bgra",
+        "-s",
+        f"{size[0]}x{size[1]}",
+        "-r",
+        str(aimed_fps),
+        "-thread_queue_size",
+        "512",
+        "-i",
+        "-",
+    ]
+    # yuv420p encoders (libx264, nvenc) reject odd dimensions: round the video size down to even numbers
+    width, height = size[0] // downsample // 2 * 2, size[1] // downsample // 2 * 2
+    if downsample != 1:
+        command += ["-vf", f"scale={width}:{height}:flags=area"]
+    elif (width, height) != size:
+        # Drop the last odd column or row rather than resampling the whole screenshot
+        command += ["-vf", f"crop={width}:{height}:0:0"]
+    command += [
+        "-c:v",
+        video_codec,
+        *VIDEO_CODEC_OPTIONS.get(video_codec, []),
+        "-movflags",
+        "+faststart",
+        path_output + "video.mp4",
+    ]
+    ffmpeg = subprocess.Popen(command, stdin=subprocess.PIPE)
+    assert ffmpeg.stdin is not None, "ffmpeg is started with a stdin pipe."
+    slots = shm.buf
+    assert slots is not None, "Shared memory is closed."
+    frame_bytes = size[0] * size[1] * 4
+    slot_bytes = _slot_bytes(frame_bytes)
+    total_slots = shm.size // slot_bytes
+    failed = False
+    number = 0
+    start_time = time.time()
+    while "there are screenshots":
+        try:
+            entry = queue.get(timeout=60)
+        except Empty:
+            warnings.warn(
+                f"WARNING: Saving worker {process_id} queue is empty. Did the grabbing process stop?",
+                RuntimeWarning,
+            )
+            break
+        except EOFError:
+            break
+        slot = entry % total_slots
+        if not failed:
+            try:
+                ffmpeg.stdin.write(slots[slot * slot_bytes : slot * slot_bytes + frame_bytes])
+                number += 1
+            except OSError as e:
+                # Keep releasing the slots so the grabbing process is not blocked
+                warnings.warn(f"WARNING: ffmpeg stopped receiving frames: {e}", RuntimeWarning)
+                failed = True
+        free_queue.put(slot)
+    try:
+        ffmpeg.stdin.close()
+    except OSError:
+        pass
+    if ffmpeg.wait() != 0:
+        warnings.warn(f"WARNING: ffmpeg exited with code {ffmpeg.returncode}.", RuntimeWarning)
+    if verbose:
+        print(f"Saving worker {process_id} finished and creating logs.")
+    elapsed = time.time() - start_time
+    stats.fps = number / elapsed
+    stats.time = elapsed
+    stats.done = True
+    shm.close()
     if verbose:
         print(f"Saving worker {process_id} sending logs to main process.")
 
@@ -181,14 +900,22 @@ class Recorder(ABC):
         self.path_output: str
         self.print_results: bool
         self.is_stopped: bool = False
+        # Set when the recording should stop. Shared by all the recorders of a manager.
+        self.stop_event = threading.Event()
 
     def set_common_parameters(
-        self, path_output: str, print_results: bool, verbose: bool = False
+        self,
+        path_output: str,
+        print_results: bool,
+        verbose: bool = False,
+        stop_event: threading.Event | None = None,
     ) -> None:
         """Set parameters common to all recorders."""
         self.path_output = path_output
         self.print_results = print_results
         self.verbose = verbose
+        if stop_event is not None:
+            self.stop_event = stop_event
 
     def check_availability(self) -> Exception | None:
         """Check if the recorder is available."""
@@ -203,7 +930,23 @@ class Recorder(ABC):
             print(f"{self.__class__.__name__} called for stop.")
         return should_stop
 
+    def request_stop(self) -> None:
+        """Ask for the recording to stop. Can be called from any thread."""
+        if self.verbose and not self.stop_event.is_set():
+            print(f"{self.__class__.__name__} called for stop.")
+        self.stop_event.set()
+
+    def _request_stop_when_finished(self, thread: threading.Thread) -> None:
+        """Call `request_stop` once the given thread has finished."""
+
+        def wait_for_thread() -> None:
+            thread.join()
+            self.request_stop()
+
+        threading.Thread(target=wait_for_thread, daemon=True).start()
+
     def stop(self) -> None:
+        self.stop_event.set()
         self._stop()
         self.is_stopped = True
         if self.verbose:
@@ -238,30 +981,59 @@ class ScreenRecording(Recorder):
 
     def __init__(
         self,
-        n_processes: int = 2,
+        n_processes: int | str = 2,
         aimed_fps: int = 10,
         format_image: str = "png",
-        compression_rate: int = 6,
+        compression_rate: int = 1,
         quality: int = 95,
         downsample: int = 1,
         max_screenshots: int = 100_000,
         allowed_n_images_delayed: int = 100,
+        backend: str = "mss",
+        drop_on_backpressure: bool = False,
+        n_threads: int = 1,
+        deduplicate: bool = False,
+        video_codec: str = "libx264rgb",
+        pin_cpus: bool = False,
+        stream: bool = False,
+        webp_method: int = 0,
+        quantize: bool = False,
     ) -> None:
         """Initialize the screen recording.
 
         Args:
-            n_processes (int): Number of processes to use for saving the screenshots. For high compression rate, it is recommended to use more processes. You can use measure_fps to adjust.
+            n_processes (int | str): Number of processes to use for saving the screenshots. For high compression rate, it is recommended to use more processes. You can use measure_fps to adjust. "auto" times the encoding of a screenshot at start and uses enough processes to save `aimed_fps` screenshots per second, up to the number of CPUs.
             aimed_fps (int): Aimed FPS for the screen recording. Lower this value when the tool fails to screenshot at the desired FPS.
-            format_image (str, optional): Format to save the screenshots to. Use Pillow's available formats(eg: "png", "jpg", "webp"). Defaults to "png".
-            compression_rate (int, optional): Compression rate for the screenshots. Higher values means smaller files and longer saving time. Only applies to PNG format. Defaults to 6.
+            format_image (str, optional): Format to save the screenshots to. Use Pillow's available formats(eg: "png", "jpg", "webp"), or "mp4" to pipe the screenshots to ffmpeg and save a single video. "mp4" requires ffmpeg and uses one saving process. Defaults to "png".
+            compression_rate (int, optional): Compression rate for the screenshots. Higher values means smaller files and longer saving time. On screen content, 1 is about twice as fast as 6 for files only a few percent bigger. Only applies to PNG format. Defaults to 1.
             quality (int, optional): Quality for the screenshots. Only applies to JPG and WEBP formats. Defaults to 95.
             downsample (int, optional): Downsample factor for the screenshots. 1 means no downsampling. 2 means half the size. 3 means one third the size. etc. Defaults to 1.
             max_screenshots (int, optional): Option to stop recording after a certain number of screenshots is taken. Defaults to 100_000.
-            allowed_n_images_delayed (int, optional): Allowed number of images accumulated in the queue. If it exceeds, the process will call stop to protect current colleted data. Defaults to 100.
+            allowed_n_images_delayed (int, optional): Allowed number of images accumulated in the queue. If it exceeds, the process will call stop to protect current colleted data. A shared memory slot is reserved for each of them per saving process. Defaults to 100.
+            backend (str, optional): Capture backend. "mss" works on every platform. "dxgi" uses the DXGI Desktop Duplication API through dxcam and is only available on Windows. "auto" uses "dxgi" when dxcam is installed, "mss" otherwise. The grabbing falls back to "mss" when the DXGI frames don't have the size of the monitor, e.g. with DPI scaling. Defaults to "mss".
+            drop_on_backpressure (bool, optional): Skip screenshots while all the shared memory slots are in use instead of slowing down the capture and stopping once a saving queue is full. The number of skipped screenshots is reported in the logs. Defaults to False.
+            n_threads (int, optional): Number of encoding threads in each saving process. The encoders release the GIL, so threads add parallelism without the memory of extra processes. Defaults to 1.
+            deduplicate (bool, optional): Save a screenshot identical to the previous one as a hard link to the previous file instead of encoding it again. Costs a comparison and a copy of each screenshot in the grabbing process. Not used with the mp4 format. Defaults to False.
+            video_codec (str, optional): ffmpeg encoder used by the mp4 format. "libx264rgb" is lossless enough for the screen and keeps RGB, "h264_nvenc" and "hevc_nvenc" encode on an NVIDIA GPU to free the CPU. The encoder must be available in the installed ffmpeg. Defaults to "libx264rgb".
+            pin_cpus (bool, optional): Pin the grabbing process to the first available CPU and give each saving process `n_threads` of the others, so the scheduler does not move them between CPUs. The saving processes are not pinned when there are not enough CPUs, or in mp4 format. Only supported on Linux and Windows. Defaults to False.
+            stream (bool, optional): Append the encoded screenshots to one stream_<process id>.bin file per saving process instead of writing one file per screenshot. Use split_stream.py to extract the images. Not used with the mp4 format. Defaults to False.
+            webp_method (int, optional): Speed of the WEBP encoder, from 0 (fastest) to 6 (smallest files). On screen content, 0 is about 1.5 times as fast as Pillow's default of 4 for files about 1% bigger. Only applies to WEBP format. Defaults to 0.
+            quantize (bool, optional): Reduce the screenshots to 256 colors and save them as palette PNGs. Desktop screenshots are mostly flat colors: the files are several times smaller, at the cost of the quantization time and of some colors in gradients and pictures. Uses libimagequant when Pillow is built with it. Only applies to PNG format. Defaults to False.
         """
 
         super().__init__()
-        self.n_processes = n_processes
+        assert n_processes == "auto" or isinstance(n_processes, int), (
+            f"Invalid n_processes: {n_processes}"
+        )
+        if format_image == "mp4" and n_processes not in (1, "auto"):
+            warnings.warn(
+                f"WARNING: The mp4 format is saved by a single process, n_processes={n_processes} is ignored."
+            )
+        # With "auto", the number of processes is set at start once the encoding is timed
+        self._auto_processes = n_processes == "auto" and format_image != "mp4"
+        self.n_processes = n_processes if isinstance(n_processes, int) else 1
+        if format_image == "mp4":
+            self.n_processes = 1
         self.aimed_fps = aimed_fps
         self.format_image = format_image
         self.compression_rate = compression_rate
@@ -269,72 +1041,247 @@ class ScreenRecording(Recorder):
         self.downsample = downsample
         self.max_screenshots = max_screenshots
         self.allowed_n_images_delayed = allowed_n_images_delayed
-        # Queues
-        self._list_queues: list[Queue] = [
-            Queue(self.allowed_n_images_delayed) for _ in range(n_processes)
-        ]
-        self._out_queue: Queue = Queue()
-        self._stop_flag = Value(ctypes.c_bool, False)
+        self.backend = backend
+        self.drop_on_backpressure = drop_on_backpressure
+        self.n_threads = n_threads
+        self.deduplicate = deduplicate
+        self.video_codec = video_codec
+        self.pin_cpus = pin_cpus
+        self.stream = stream
+        self.webp_method = webp_method
+        self.quantize = quantize
+        # Rings of slot indices, one pair per saving process. Allocated at start.
+        self._list_queues: list[SPSCRing] = []
+        self._free_queues: list[SPSCRing] = []
+        # Shared memory slots for the screenshots. Allocated at start when the screen size is known.
+        self._shm: SharedMemory | None = None
+        # Capture time of each screenshot, written by the grabbing process. Allocated at start.
+        self._timestamps_ns: ctypes.Array | None = None
+        # Rect of the recorded monitor. Probed in check_availability.
+        self._rect: Dict[str, int] | None = None
+        # Statistics of the grabbing and saving processes, read once they are joined
+        self._grab_stats = RawValue(GrabStats)
+        self._save_stats: list[SaveStats] = []
+        # Only written by the main process: no lock is needed to read it in the grab loop
+        self._stop_flag = RawValue(ctypes.c_bool, False)
 
         # Processes
-        self._p_grab: Process | None = None
-        self._p_saves: list[Process] = []
+        self._p_grab: Process | threading.Thread | None = None
+        self._p_saves: list[Process | threading.Thread] = []
 
     def check_availability(self) -> Exception | None:
         with mss.mss() as sct:
             try:
-                _ = {
-                    "top": sct.monitors[1]["top"],
-                    "left": sct.monitors[1]["left"],
-                    "width": sct.monitors[1]["width"],
-                    "height": sct.monitors[1]["height"],
+                monitor = sct.monitors[1]
+                # Kept to size the shared memory and given to the grabbing process
+                self._rect = {
+                    "top": monitor["top"],
+                    "left": monitor["left"],
+                    "width": monitor["width"],
+                    "height": monitor["height"],
                 }
             except Exception as e:
                 raise UnpluggedError("No screen found.") from e
+        if self.backend == "dxgi" and dxcam is None:
+            return ImportError(
+                "dxcam is required for the dxgi backend. Install it with the dxgi extra."
+            )
+        if self.format_image == "mp4":
+            if shutil.which("ffmpeg") is None:
+                return FileNotFoundError("ffmpeg is required for the mp4 format.")
+            encoders = subprocess.run(
+                ["ffmpeg", "-hide_banner", "-encoders"], capture_output=True, text=True
+            ).stdout
+            if f" {self.video_codec} " not in encoders:
+                return ValueError(f"The ffmpeg encoder {self.video_codec} is not available.")
         return None
 
     def _start(self) -> None:
         """Start the screen recording."""
         assert self.n_processes > 0, "n_processes must be 1 or more"
-        # 2 processes: one for grabbing and one for saving PNG files
-        # grabing is in the main process
-        self._p_grab = Process(
+        assert self.n_threads > 0, "n_threads must be 1 or more"
+        assert self.backend in ("auto", "mss", "dxgi"), f"Invalid backend: {self.backend}"
+        backend = self.backend
+        if backend == "auto":
+            backend = "mss" if dxcam is None else "dxgi"
+        if self._rect is None:
+            # Started without checking the availability
+            exception = self.check_availability()
+            if exception is not None:
+                raise exception
+        assert self._rect is not None, "Screen rect is set by check_availability."
+        size = (self._rect["width"], self._rect["height"])
+        # The saving processes write straight into the directory. Created here too when not started by a Manager.
+        os.makedirs(self.path_output, exist_ok=True)
+        if self._auto_processes:
+            self.n_processes = self._calibrate_n_processes()
+        self._list_queues = [
+            SPSCRing(self.allowed_n_images_delayed) for _ in range(self.n_processes)
+        ]
+        self._free_queues = [
+            SPSCRing(self.allowed_n_images_delayed) for _ in range(self.n_processes)
+        ]
+        self._save_stats = [RawValue(SaveStats) for _ in range(self.n_processes)]
+        self._timestamps_ns = RawArray(ctypes.c_int64, self.max_screenshots)
+        self._shm = SharedMemory(
+            create=True,
+            size=_slot_bytes(size[0] * size[1] * 4)
+            * self.n_processes
+            * self.allowed_n_images_delayed,
+        )
+        # One worker for grabbing and n_processes workers for saving. They are threads when the GIL is
+        # disabled: each gets its own handle on the shared memory since they close it when they finish.
+        worker: type[Process] | type[threading.Thread] = (
+            threading.Thread if GIL_DISABLED else Process
+        )
+        shm = self._shm
+
+        def worker_shm() -> SharedMemory:
+            return _attach_shm(shm.name) if GIL_DISABLED else shm
+
+        self._p_grab = worker(
             target=_grab,
             args=(
                 self._list_queues,
-                self._out_queue,
+                self._free_queues,
+                worker_shm(),
+                self._rect,
+                self._timestamps_ns,
+                self._grab_stats,
                 self._stop_flag,
                 self.aimed_fps,
                 self.max_screenshots,
+                backend,
+                self.drop_on_backpressure,
+                self.deduplicate and self.format_image != "mp4",
                 self.verbose,
             ),
         )
-        self._p_saves = [
-            Process(
-                target=_save,
-                args=(
-                    queue,
-                    self._out_queue,
-                    self.path_output,
-                    self.compression_rate,
-                    self.quality,
-                    self.downsample,
-                    id,
-                    self.n_processes,
-                    self.format_image,
-                    self.verbose,
-                ),
-            )
-            for id, queue in enumerate(self._list_queues)
-        ]
+        if self.format_image == "mp4":
+            self._p_saves = [
+                worker(
+                    target=_save_video,
+                    args=(
+                        self._list_queues[0],
+                        self._free_queues[0],
+                        worker_shm(),
+                        size,
+                        self._save_stats[0],
+                        self.path_output,
+                        self.aimed_fps,
+                        self.downsample,
+                        0,
+                        self.video_codec,
+                        self.verbose,
+                    ),
+                )
+            ]
+        else:
+            self._p_saves = [
+                worker(
+                    target=_save,
+                    args=(
+                        queue,
+                        free_queue,
+                        worker_shm(),
+                        size,
+                        self._save_stats[id],
+                        self.path_output,
+                        self.compression_rate,
+                        self.quality,
+                        self.downsample,
+                        id,
+                        self.format_image,
+                        self.n_threads,
+                        self.stream,
+                        self.webp_method,
+                        self.quantize,
+                        self.verbose,
+                    ),
+                )
+                for id, (queue, free_queue) in enumerate(zip(self._list_queues, self._free_queues))
+            ]
         self._p_grab.start()
         for p_save in self._p_saves:
             p_save.start()
+        if self.pin_cpus and GIL_DISABLED:
+            warnings.warn(
+                "WARNING: The workers are threads when the GIL is disabled: pin_cpus is ignored."
+            )
+        elif self.pin_cpus:
+            self._pin_processes()
+        threading.Thread(target=self._watch, daemon=True).start()
+
+    def _calibrate_n_processes(self) -> int:
+        """Time the encoding of a screenshot and return the number of saving processes keeping up with `aimed_fps`."""
+        assert self._rect is not None, "Screen rect is set by check_availability."
+        encode = _make_encoder(
+            self.format_image,
+            self.compression_rate,
+            self.quality,
+            self.downsample,
+            self.webp_method,
+            self.quantize,
+        )
+        with mss.mss() as sct:
+            screenshot = sct.grab(self._rect)
+        img_pil = Image.frombuffer("RGB", screenshot.size, screenshot.bgra, "raw", "BGRX", 0, 1)
+        durations = []
+        for _ in range(3):
+            start = time.perf_counter()
+            encode(img_pil)
+            durations.append(time.perf_counter() - start)
+        encode_time = min(durations)
+        n_processes = math.ceil(encode_time * self.aimed_fps / self.n_threads)
+        n_processes = max(1, min(n_processes, len(_available_cpus())))
+        print(
+            f"Encoding a screenshot takes {encode_time * 1000:.1f} ms: using {n_processes} saving processes."
+        )
+        return n_processes
+
+    def _pin_processes(self) -> None:
+        """Pin the grabbing process to the first CPU and give each saving process its own CPUs among the others.
+
+        A saving process gets `n_threads` CPUs for its encoding threads. The saving processes are left to the
+        scheduler when there are not enough CPUs for all of them, and in mp4 format, where the ffmpeg child
+        would inherit the affinity of its saving process.
+        """
+        assert isinstance(self._p_grab, Process) and self._p_grab.pid is not None, (
+            "Processes are started."
+        )
+        cpus = _available_cpus()
+        _pin_to_cpus(self._p_grab.pid, cpus[:1])
+        if self.format_image == "mp4":
+            return
+        saving_cpus = cpus[1:]
+        if len(saving_cpus) < len(self._p_saves) * self.n_threads:
+            warnings.warn(
+                f"WARNING: {len(saving_cpus)} CPUs left for {len(self._p_saves)} saving processes of "
+                + f"{self.n_threads} threads: only the grabbing process is pinned.",
+                RuntimeWarning,
+            )
+            return
+        for i, p_save in enumerate(self._p_saves):
+            assert isinstance(p_save, Process) and p_save.pid is not None, "Processes are started."
+            _pin_to_cpus(p_save.pid, saving_cpus[i * self.n_threads : (i + 1) * self.n_threads])
+
+    def _watch(self) -> None:
+        """Thread that asks to stop when the grabbing process ends or the saving processes fall behind."""
+        assert self._p_grab is not None, "Grabbing process has not started."
+        while not self.stop_event.is_set():
+            self._p_grab.join(timeout=0.25)
+            if self._workers_should_stop():
+                self.request_stop()
+                return
 
     def _should_stop(self) -> bool:
+        """The workers are checked by the `_watch` thread alone, so its warnings are printed once."""
+        return self.stop_event.is_set()
+
+    def _workers_should_stop(self) -> bool:
         """Call to stop if grabbing process has stopped or if the number of images accumulated in the saving queues exceeds the allowed number."""
         assert self._p_grab is not None, "Grabbing process has not started. Call start() first."
-        if any(queue.full() for queue in self._list_queues):
+        if not self.drop_on_backpressure and any(queue.full() for queue in self._list_queues):
             warnings.warn(
                 f"WARNING: Out of memory: Stopping recording because the number of images accumulated in the saving queues exceeds the allowed number: allowed_n_images_delayed={self.allowed_n_images_delayed}. Consider increasing the number of processes or decreasing the aimed FPS.",
                 RuntimeWarning,
@@ -348,31 +1295,53 @@ class ScreenRecording(Recorder):
 
     def _join(self) -> tuple[Dict[str, Any], List[Dict[str, Any]]]:
         """Stop the screen recording."""
-        logs: List[Dict[str, Any]] = []
-        while len(logs) < self.n_processes + 1:
-            # Wait for all logs to be received
-            try:
-                log = self._out_queue.get(timeout=60)
-                logs.append(log)
-            except Empty:
+        if self._p_grab is None:
+            raise ValueError("Grabbing process has not started")
+        for process in [self._p_grab, *self._p_saves]:
+            process.join(timeout=60)
+            while process.is_alive():
                 warnings.warn(
-                    f"WARNING: Log queue waiting out after receiving {len(logs)}/{self.n_processes + 1} logs. "
+                    f"WARNING: Waiting for {process.name} to finish. "
                     + "One saving process might be still running or have failed.",
                     RuntimeWarning,
                 )
+                process.join(timeout=60)
+        # The processes are finished: their statistics can be read without synchronization
+        logs: List[Dict[str, Any]] = []
+        if self._grab_stats.done:
+            logs.append(
+                {
+                    "log": "grabbing",
+                    "fps": self._grab_stats.fps,
+                    "time": self._grab_stats.time,
+                    "max_stable_fps": self._grab_stats.max_stable_fps,
+                    "dropped": self._grab_stats.dropped,
+                    "missed": self._grab_stats.missed,
+                    "n_screenshots": self._grab_stats.n_screenshots,
+                    "epoch_ns": self._grab_stats.epoch_ns,
+                }
+            )
+        for process_id, stats in enumerate(self._save_stats[: len(self._p_saves)]):
+            if stats.done:
+                logs.append(
+                    {"log": "saving", "id": process_id, "fps": stats.fps, "time": stats.time}
+                )
         print(f"All {len(logs)} logs received.")
-        # After all logs are received, the processes should have been finished
-        if self._p_grab is not None:
-            self._p_grab.join()
-        else:
-            raise ValueError("Grabbing process has not started")
-        for p_save in self._p_saves:
-            p_save.join()
-        # Close the queues
-        for queue in self._list_queues:
-            queue.close()
-        self._out_queue.close()
+        # Release the shared memory
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+        if not self._grab_stats.done:
+            raise RuntimeError("The grabbing process failed before sending its logs.")
         grab_log, saving_logs = self._get_logs(logs)
+        assert self._timestamps_ns is not None, "Timestamps are allocated at start."
+        grab_log["timestamps"] = array(
+            "d",
+            [
+                (grab_log["epoch_ns"] + t) / 1e9
+                for t in self._timestamps_ns[: grab_log["n_screenshots"]]
+            ],
+        )
         self._save_timestamps(grab_log)
         if self.print_results:
             self._print_results(grab_log, saving_logs)
@@ -381,11 +1350,7 @@ class ScreenRecording(Recorder):
     def _save_timestamps(self, grab_log: Dict[str, Any]) -> None:
         """Save the timestamps of the screen recording to a file."""
         with open(self.path_output + "timestamps.txt", "w", encoding="utf-8") as f:
-            for incr, timestamp in enumerate(grab_log["timestamps"]):
-                if incr == len(grab_log["timestamps"]) - 1:
-                    f.write(f"{timestamp:.6f}")
-                else:
-                    f.write(f"{timestamp:.6f}\n")
+            f.write("\n".join([f"{timestamp:.6f}" for timestamp in grab_log["timestamps"]]))
 
     def _get_logs(self, logs: List[Dict[str, Any]]) -> tuple[Dict[str, Any], List[Dict[str, Any]]]:
         saving_logs: List[Dict[str, Any]] = []
@@ -410,41 +1375,45 @@ class ScreenRecording(Recorder):
         lst_save_time = [round(log["time"], 2) for log in saving_logs]
         print("-" * 100)
         print(f"Process grab FPS: {grab_fps}")
+        if self.drop_on_backpressure:
+            print(f"Dropped screenshots: {grab_log['dropped']}")
+        if grab_log["missed"]:
+            print(f"Missed frames: {grab_log['missed']} (the grabbing fell behind the aimed FPS)")
         print(f"Processes saving FPS: {lst_save_fps}")
         print(f"Process grab time: {grab_time}")
         print(f"Processes save time: {lst_save_time}")
 
 
 class KeyboardRecording(Recorder):
-    """Keyboard Recording class. It captures the keyboard inputs and saves the data to a separate file."""
+    """Keyboard Recording class. It captures the keyboard inputs and saves the data to a separate file.
+
+    Events are stored column-wise (timestamps and type codes in typed arrays) so that the listener
+    callback only appends scalars; the log dictionaries are only built when saving.
+    """
+
+    _EVENT_TYPES = ("pressed", "release")
 
     def on_press(self, key: keyboard.KeyCode | keyboard.Key | None) -> None:
         """Called when pressing a key."""
         if key is None:
             return
-        self._action_logs.append(
-            {
-                "timestamp": time.time(),
-                "type": "pressed",
-                "key": key.char if isinstance(key, keyboard.KeyCode) else key.name,
-            }
-        )
+        self._timestamps.append(time.time())
+        self._types.append(0)
+        self._keys.append(key.char if isinstance(key, keyboard.KeyCode) else key.name)
 
     def on_release(self, key: keyboard.KeyCode | keyboard.Key | None) -> None:
         """Called when releasing a key."""
         if key is None:
             return
-        self._action_logs.append(
-            {
-                "timestamp": time.time(),
-                "type": "release",
-                "key": key.char if isinstance(key, keyboard.KeyCode) else key.name,
-            }
-        )
+        self._timestamps.append(time.time())
+        self._types.append(1)
+        self._keys.append(key.char if isinstance(key, keyboard.KeyCode) else key.name)
 
     def __init__(self) -> None:
         super().__init__()
-        self._action_logs: List[Dict[str, Any]] = []
+        self._timestamps = array("d")
+        self._types = array("B")
+        self._keys: List[str | None] = []
         self.keyboard_listener = keyboard.Listener(
             on_press=self.on_press, on_release=self.on_release
         )
@@ -452,6 +1421,7 @@ class KeyboardRecording(Recorder):
     def _start(self) -> None:
         """Start the keyboard recording."""
         self.keyboard_listener.start()
+        self._request_stop_when_finished(self.keyboard_listener)
 
     def _stop(self) -> None:
         """Stop the keyboard recording."""
@@ -461,51 +1431,56 @@ class KeyboardRecording(Recorder):
         """Call to stop if keyboard recording has stopped."""
         return not self.keyboard_listener.is_alive()
 
+    def _decode_logs(self) -> List[Dict[str, Any]]:
+        """Rebuild the list of keyboard events from the recorded columns."""
+        return [
+            {"timestamp": timestamp, "type": self._EVENT_TYPES[event_type], "key": key}
+            for timestamp, event_type, key in zip(self._timestamps, self._types, self._keys)
+        ]
+
     def _join(self) -> None:
         """Wait for the keyboard recording to finish and save the logs."""
         self.keyboard_listener.join(timeout=10)
         if self.keyboard_listener.is_alive():
             warnings.warn("WARNING: Keyboard listener did not stop.")
-        with open(self.path_output + "keyboard_logs.json", "w", encoding="utf-8") as f:
-            json.dump(self._action_logs, f)
+        _dump_json(self._decode_logs(), self.path_output + "keyboard_logs.json")
 
 
 class MouseRecording(Recorder):
-    """Mouse Recording class. It captures the mouse inputs and saves the data to a separate file."""
+    """Mouse Recording class. It captures the mouse inputs and saves the data to a separate file.
+
+    Events are stored column-wise; the extra fields of clicks and scrolls are kept in order in a
+    separate list and the log dictionaries are only built when saving.
+    """
+
+    _EVENT_TYPES = ("move", "click", "scroll")
 
     def on_move(self, x: int, y: int):
         """Called when moving the mouse."""
-        self._action_logs.append({"timestamp": time.time(), "type": "move", "x": x, "y": y})
+        self._timestamps.append(time.time())
+        self._types.append(0)
+        self._positions.append((x, y))
 
     def on_click(self, x: int, y: int, button: mouse.Button, pressed: bool):
         """Called when clicking the mouse."""
-        self._action_logs.append(
-            {
-                "timestamp": time.time(),
-                "type": "click",
-                "x": x,
-                "y": y,
-                "button": button.name,
-                "is_pressed": pressed,
-            }
-        )
+        self._timestamps.append(time.time())
+        self._types.append(1)
+        self._positions.append((x, y))
+        self._details.append((button.name, pressed))
 
     def on_scroll(self, x: int, y: int, dx: int, dy: int):
         """Called when scrolling the mouse."""
-        self._action_logs.append(
-            {
-                "timestamp": time.time(),
-                "type": "scroll",
-                "x": x,
-                "y": y,
-                "dx": dx,
-                "dy": dy,
-            }
-        )
+        self._timestamps.append(time.time())
+        self._types.append(2)
+        self._positions.append((x, y))
+        self._details.append((dx, dy))
 
     def __init__(self) -> None:
         super().__init__()
-        self._action_logs: List[Dict[str, Any]] = []
+        self._timestamps = array("d")
+        self._types = array("B")
+        self._positions: List[Tuple[int, int]] = []
+        self._details: List[Tuple[Any, Any]] = []
         self.mouse_listener = mouse.Listener(
             on_move=self.on_move, on_click=self.on_click, on_scroll=self.on_scroll
         )
@@ -513,6 +1488,7 @@ class MouseRecording(Recorder):
     def _start(self) -> None:
         """Start the mouse recording."""
         self.mouse_listener.start()
+        self._request_stop_when_finished(self.mouse_listener)
 
     def _stop(self) -> None:
         """Stop the mouse recording."""
@@ -522,13 +1498,25 @@ class MouseRecording(Recorder):
         """Call to stop if mouse recording has stopped."""
         return not self.mouse_listener.is_alive()
 
+    def _decode_logs(self) -> List[Dict[str, Any]]:
+        """Rebuild the list of mouse events from the recorded columns."""
+        details = iter(self._details)
+        logs: List[Dict[str, Any]] = []
+        for timestamp, event_type, (x, y) in zip(self._timestamps, self._types, self._positions):
+            log = {"timestamp": timestamp, "type": self._EVENT_TYPES[event_type], "x": x, "y": y}
+            if event_type == 1:
+                log["button"], log["is_pressed"] = next(details)
+            elif event_type == 2:
+                log["dx"], log["dy"] = next(details)
+            logs.append(log)
+        return logs
+
     def _join(self) -> None:
         """Wait for the mouse recording to finish and save the logs."""
         self.mouse_listener.join(timeout=10)
         if self.mouse_listener.is_alive():
             warnings.warn("WARNING: Mouse listener did not stop.")
-        with open(self.path_output + "mouse_logs.json", "w", encoding="utf-8") as f:
-            json.dump(self._action_logs, f)
+        _dump_json(self._decode_logs(), self.path_output + "mouse_logs.json")
 
 
 class StopRecording(Recorder):
@@ -555,6 +1543,7 @@ class StopRecording(Recorder):
     def _return_flag(self) -> None:
         """Return flag to stop the recording"""
         self.hotkey_pressed = True
+        self.request_stop()
 
     def _stop(self) -> None:
         self.hotkey_listener.stop()
@@ -566,44 +1555,99 @@ class StopRecording(Recorder):
 
 
 class GamepadRecording(Recorder):
-    """Gamepad Recording class. It captures the gamepad inputs and saves the data to a separate file."""
+    """Gamepad Recording class. It captures the gamepad inputs and saves the data to a separate file.
+
+    Events are stored column-wise; the axis values are kept in order in a separate array and the log
+    dictionaries are only built when saving.
+    """
+
+    _EVENT_TYPES = ("pressed", "released", "absolute")
+
+    def _log_event(self, ev_type: str, code: str, state: int) -> None:
+        """Add a gamepad event to the logs."""
+        if ev_type == "Key":
+            if state not in (0, 1):
+                return
+            self._timestamps.append(time.time())
+            self._types.append(0 if state == 1 else 1)
+            self._codes.append(code)
+        elif ev_type == "Absolute":
+            self._timestamps.append(time.time())
+            self._types.append(2)
+            self._codes.append(code)
+            self._values.append(state)
+
+    def _decode_logs(self) -> List[Dict[str, Any]]:
+        """Rebuild the list of gamepad events from the recorded columns."""
+        values = iter(self._values)
+        logs: List[Dict[str, Any]] = []
+        for timestamp, event_type, code in zip(self._timestamps, self._types, self._codes):
+            if event_type == 2:
+                logs.append(
+                    {
+                        "timestamp": timestamp,
+                        "type": "absolute",
+                        "axis": code,
+                        "value": next(values),
+                    }
+                )
+            else:
+                logs.append(
+                    {"timestamp": timestamp, "type": self._EVENT_TYPES[event_type], "key": code}
+                )
+        return logs
+
+    def _read_evdev(self) -> None:
+        """Read the events from the gamepad character device on Linux.
+
+        The device is waited on together with the wake-up pipe, so `_stop` interrupts the wait even
+        when the gamepad is idle.
+        """
+        fd = os.open(devices.gamepads[0].get_char_device_path(), os.O_RDONLY | os.O_NONBLOCK)
+        try:
+            with selectors.DefaultSelector() as selector:
+                selector.register(fd, selectors.EVENT_READ)
+                selector.register(self._wake_r, selectors.EVENT_READ)
+                while not self._stop_event.is_set():
+                    for key, _ in selector.select():
+                        if key.fd == self._wake_r:
+                            return
+                        try:
+                            data = os.read(fd, EVENT_SIZE * 64)
+                        except BlockingIOError:
+                            continue
+                        # The kernel only returns whole events
+                        for _, _, raw_type, raw_code, state in struct.iter_unpack(
+                            EVENT_FORMAT, data
+                        ):
+                            ev_type = devices.get_event_type(raw_type)
+                            if ev_type in ("Key", "Absolute"):
+                                self._log_event(
+                                    ev_type, devices.get_event_string(ev_type, raw_code), state
+                                )
+        finally:
+            os.close(fd)
 
     def get_gamepad_inputs(self) -> None:
         """Thread that captures the gamepad inputs"""
+        if NIX:
+            self._read_evdev()
+            return
         while not self._stop_event.is_set():
             events = get_gamepad()
             for event in events:
-                if event.ev_type == "Key":
-                    if event.state == 1:
-                        self._action_logs.append(
-                            {
-                                "timestamp": time.time(),
-                                "type": "pressed",
-                                "key": event.code,
-                            }
-                        )
-                    elif event.state == 0:
-                        self._action_logs.append(
-                            {
-                                "timestamp": time.time(),
-                                "type": "released",
-                                "key": event.code,
-                            }
-                        )
-                elif event.ev_type == "Absolute":
-                    self._action_logs.append(
-                        {
-                            "timestamp": time.time(),
-                            "type": "absolute",
-                            "axis": event.code,
-                            "value": event.state,
-                        }
-                    )
+                self._log_event(event.ev_type, event.code, event.state)
 
     def __init__(self) -> None:
         super().__init__()
-        self._action_logs: List[Dict[str, str | int | float | bool]] = []
+        self._timestamps = array("d")
+        self._types = array("B")
+        self._codes: List[str] = []
+        self._values = array("i")
         self._stop_event = threading.Event()
+        # Pipe written to by `_stop` to wake up the thread waiting for gamepad events. Only created by
+        # `_start`, so an unavailable gamepad doesn't leave it open.
+        self._wake_r, self._wake_w = -1, -1
         self._gamepad_thread = threading.Thread(
             target=self.get_gamepad_inputs,
         )
@@ -618,21 +1662,27 @@ class GamepadRecording(Recorder):
             return UnpluggedError("No gamepad found.")
 
     def _start(self) -> None:
+        self._wake_r, self._wake_w = os.pipe()
         self._gamepad_thread.start()
+        self._request_stop_when_finished(self._gamepad_thread)
 
     def _stop(self) -> None:
         self._stop_event.set()
+        if self._wake_w >= 0:
+            os.write(self._wake_w, b"x")
 
     def _join(self) -> None:
-        # Add a timeout here as an exception because the gampad thread won't stop until a gamepad input is detected
-        # TODO: Find a way to add a timeout
+        # On Linux the thread is woken up by `_stop`. Elsewhere `get_gamepad` blocks and the thread
+        # won't stop until a gamepad input is detected, hence the timeout.
         self._gamepad_thread.join(timeout=10)
         if self._gamepad_thread.is_alive():
             warnings.warn("WARNING: Gamepad thread did not stop.")
+        else:
+            os.close(self._wake_r)
+            os.close(self._wake_w)
         # Dump the action logs to a file
         time_to_save = time.time()
-        with open(self.path_output + "gamepad_logs.json", "w", encoding="utf-8") as f:
-            json.dump(self._action_logs, f)
+        _dump_json(self._decode_logs(), self.path_output + "gamepad_logs.json")
         print(f"Time to save gamepad logs: {time.time() - time_to_save:.2f} seconds")
 
     def _should_stop(self) -> bool:
@@ -667,9 +1717,13 @@ class Manager:
         self.verbose = verbose
         # Create the output directory
         os.makedirs(self.path_output, exist_ok=True)
+        # Set by any recorder that wants the recording to stop
+        self.stop_event = threading.Event()
         # Set parameters common to all recorders
         for recorder in list_recorders:
-            recorder.set_common_parameters(self.path_output, self.print_results, self.verbose)
+            recorder.set_common_parameters(
+                self.path_output, self.print_results, self.verbose, self.stop_event
+            )
         self.is_stopped = False  # Flag to check if stop() has been called
 
     def start(self) -> None:
@@ -690,6 +1744,7 @@ class Manager:
             recorder.start()
 
     def stop(self) -> None:
+        self.stop_event.set()
         for recorder in self.list_recorders:
             recorder.stop()
         self.is_stopped = True
@@ -712,14 +1767,9 @@ class Manager:
         start_time = time.time()
         self.start()
         print("Recording started.")
-        while time.time() - start_time < timeout:
-            time.sleep(0.1)
-            for recorder in self.list_recorders:
-                if recorder.should_stop():
-                    self.stop()
-                    self.join()
-                    return
-        print("Timeout reached.")
+        # Wait for a recorder to ask for the stop
+        if not self.stop_event.wait(max(0, timeout - (time.time() - start_time))):
+            print("Timeout reached.")
         self.stop()
         self.join()
 
@@ -768,9 +1818,15 @@ def parse_args() -> argparse.Namespace:
     )
     screen_group.add_argument(
         "--n-processes",
-        type=int,
+        type=lambda value: value if value == "auto" else int(value),
         default=2,
-        help="Number of processes for saving screenshots",
+        help='Number of processes for saving screenshots. "auto" picks it from the time to encode a screenshot.',
+    )
+    screen_group.add_argument(
+        "--n-threads",
+        type=int,
+        default=1,
+        help="Number of encoding threads in each saving process",
     )
     screen_group.add_argument(
         "--fps",
@@ -782,13 +1838,13 @@ def parse_args() -> argparse.Namespace:
         "--format",
         type=str,
         default="png",
-        choices=["png", "jpg", "webp"],
-        help='Format to save the screenshots to. Use Pillow\'s available formats(eg: "png", "jpg", "webp").',
+        choices=["png", "jpg", "webp", "mp4"],
+        help='Format to save the screenshots to. Use Pillow\'s available formats(eg: "png", "jpg", "webp"). "mp4" pipes the screenshots to ffmpeg to save a single video.',
     )
     screen_group.add_argument(
         "--compression",
         type=int,
-        default=6,
+        default=1,
         choices=range(0, 10),
         metavar="[0-9]",
         help="PNG compression rate (0=none, 9=max). Higher values means smaller files but longer saving time.",
@@ -801,6 +1857,19 @@ def parse_args() -> argparse.Namespace:
         metavar="[0-100]",
         help="Quality for the screenshots. Only applies to JPG and WEBP formats. Higher values means better quality but slower saving time.",
     )
+    screen_group.add_argument(
+        "--quantize",
+        action="store_true",
+        help="Reduce the screenshots to 256 colors and save them as palette PNGs. Only applies to PNG format.",
+    )
+    screen_group.add_argument(
+        "--webp-method",
+        type=int,
+        default=0,
+        choices=range(0, 7),
+        metavar="[0-6]",
+        help="Speed of the WEBP encoder. 0 is the fastest, 6 gives the smallest files. Only applies to WEBP format.",
+    )
     screen_group.add_argument(
         "--downsample",
         type=int,
@@ -820,6 +1889,40 @@ def parse_args() -> argparse.Namespace:
         help="Allowed number of images in queue before auto-stop. Used to avoid out of memory errors.",
     )
 
+    screen_group.add_argument(
+        "--drop-frames",
+        action="store_true",
+        help="Skip screenshots when the saving processes fall behind instead of slowing down and stopping.",
+    )
+    screen_group.add_argument(
+        "--deduplicate",
+        action="store_true",
+        help="Hard link screenshots identical to the previous one instead of encoding them again.",
+    )
+    screen_group.add_argument(
+        "--stream",
+        action="store_true",
+        help="Append the screenshots to one stream file per saving process. Extract them with split_stream.py.",
+    )
+    screen_group.add_argument(
+        "--pin-cpus",
+        action="store_true",
+        help="Pin the grabbing process and the saving processes to separate CPUs.",
+    )
+    screen_group.add_argument(
+        "--video-codec",
+        type=str,
+        default="libx264rgb",
+        help='ffmpeg encoder for the mp4 format (eg: "libx264rgb", "libx264", "h264_nvenc", "hevc_nvenc").',
+    )
+    screen_group.add_argument(
+        "--backend",
+        type=str,
+        default="mss",
+        choices=["auto", "mss", "dxgi"],
+        help='Capture backend. "dxgi" uses DXGI Desktop Duplication on Windows (requires dxcam). "auto" uses it when dxcam is installed.',
+    )
+
     # Hotkey settings
     hotkey_group = parser.add_argument_group("Global Hotkey Settings")
     hotkey_group.add_argument(
@@ -862,13 +1965,22 @@ def main() -> None:
         recorders.append(
             ScreenRecording(
                 n_processes=args.n_processes,
+                n_threads=args.n_threads,
                 aimed_fps=args.fps,
                 format_image=args.format,
                 compression_rate=args.compression,
                 quality=args.quality,
+                webp_method=args.webp_method,
+                quantize=args.quantize,
                 downsample=args.downsample,
                 max_screenshots=args.max_screenshots,
                 allowed_n_images_delayed=args.queue_size,
+                backend=args.backend,
+                drop_on_backpressure=args.drop_frames,
+                deduplicate=args.deduplicate,
+                video_codec=args.video_codec,
+                pin_cpus=args.pin_cpus,
+                stream=args.stream,
             )
         )
     if not args.no_keyboard:
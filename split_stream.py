@@ -0,0 +1,76 @@
+"""Extract the screenshots of the stream files written by the screen recording with the stream option."""
+
+import argparse
+import glob
+import os
+import shutil
+
+from main import STREAM_MAGIC, STREAM_RECORD
+
+
+def split_stream(path_stream: str, path_output: str) -> int:
+    """Write each screenshot of a stream file to its own file_<number>.<format> file.
+
+    Args:
+        path_stream (str): Path of the stream file.
+        path_output (str): Directory to write the screenshots to.
+
+    Returns:
+        int: Number of screenshots extracted.
+    """
+    number = 0
+    with open(path_stream, "rb") as f:
+        header = f.read(len(STREAM_MAGIC) + 8)
+        if not header.startswith(STREAM_MAGIC):
+            raise ValueError(f"{path_stream} is not a screen recording stream.")
+        format_image = header[len(STREAM_MAGIC) :].rstrip(b"\0").decode()
+        previous_output: str | None = None
+        while record := f.read(STREAM_RECORD.size):
+            if len(record) < STREAM_RECORD.size:
+                # Truncated stream: the recording was interrupted
+                break
+            frame, size = STREAM_RECORD.unpack(record)
+            output = os.path.join(path_output, f"file_{frame}.{format_image}")
+            if size == 0:
+                # Same screenshot as the previous one
+                assert previous_output is not None, "A duplicate follows a screenshot."
+                try:
+                    os.link(previous_output, output)
+                except OSError:
+                    shutil.copyfile(previous_output, output)
+            else:
+                data = f.read(size)
+                if len(data) < size:
+                    break
+                with open(output, "wb") as out:
+                    out.write(data)
+                previous_output = output
+            number += 1
+    return number
+
+
+def main(path_recording: str, remove: bool = False) -> None:
+    """Extract the screenshots of all the stream files of a recording.
+
+    Args:
+        path_recording (str): Directory of the recording, containing the stream_<process id>.bin files.
+        remove (bool): Whether to remove the stream files once extracted.
+    """
+    paths_stream = sorted(glob.glob(os.path.join(path_recording, "stream_*.bin")))
+    if not paths_stream:
+        raise FileNotFoundError(f"No stream file found in {path_recording}.")
+    for path_stream in paths_stream:
+        number = split_stream(path_stream, path_recording)
+        print(f"{path_stream}: {number} screenshots extracted.")
+        if remove:
+            os.remove(path_stream)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("path_recording", type=str, help="Directory of the recording.")
+    parser.add_argument(
+        "--remove", action="store_true", help="Remove the stream files once extracted."
+    )
+    args = parser.parse_args()
+    main(args.path_recording, remove=args.remove)
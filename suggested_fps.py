@@ -1,13 +1,15 @@
 """Return suggested FPS and config for the screen recording."""
 
 import os
-import time
 
 from tqdm import tqdm
 
 from main import ScreenRecording
 
 PATH_OUTPUT = "./screenshots/temp/"
+# Shared memory slots of each saving process while testing a config. Kept small so a saving process
+# slower than its share of the aimed FPS runs out of slots and drops screenshots within the run.
+SLOTS_PER_PROCESS = 4
 
 
 def main(
@@ -23,8 +25,8 @@ def main(
         n_screenshots (int): Number of screenshots to take.
         verbose (bool): Whether to print verbose output.
     """
-    best_fps = []
-    most_stable_fps = []
+    # Safe configs found: number of processes, aimed FPS, mean FPS and most stable FPS
+    safe_configs = []
     for n_processes in tqdm(range(1, max_processes + 1)):
         aimed_fps = max_fps
         while aimed_fps >= 10:
@@ -38,20 +40,21 @@ def main(
                 aimed_fps=aimed_fps,
                 compression_rate=6,
                 max_screenshots=n_screenshots,
+                allowed_n_images_delayed=SLOTS_PER_PROCESS,
+                # Keep grabbing at the aimed FPS and count the screenshots the savers can't keep up with
+                drop_on_backpressure=True,
             )
             screen_recorder.set_common_parameters(
                 path_output=PATH_OUTPUT, print_results=verbose
             )
             screen_recorder.start()
-            # Stop the screen recording
-            while not screen_recorder.should_stop():
-                time.sleep(0.01)
+            # Stop the screen recording once it asks for it
+            screen_recorder.stop_event.wait()
             screen_recorder.stop()
-            grab_log, saving_logs = screen_recorder.join()
+            grab_log, _ = screen_recorder.join()
             # Check if the config is safe
             is_unsafe = False
             # For grabbing
-            grab_time = grab_log["time"]
             max_stable_fps = grab_log["max_stable_fps"]
             mean_fps = grab_log["fps"]
             if mean_fps < 0.9 * aimed_fps:
@@ -62,33 +65,36 @@ def main(
                         f"Can't record screen at {aimed_fps}, current FPS: {mean_fps}"
                     )
             # For saving
-            save_times = [log["time"] for log in saving_logs]
-            for save_time in save_times:
-                if save_time > grab_time + 1:
-                    # Config is unsafe
-                    is_unsafe = True
-                    if verbose:
-                        print(
-                            f"Save time: {save_time} is more than 1 second longer than screenshot time {grab_time}"
-                        )
+            dropped = grab_log["dropped"]
+            if dropped > 0:
+                # Config is unsafe
+                is_unsafe = True
+                if verbose:
+                    print(
+                        f"{dropped} screenshots were dropped because the saving processes fell behind"
+                    )
             if not is_unsafe:
                 if verbose:
                     print(f"Most stable FPS: {max_stable_fps}")
                     print(f"Mean FPS: {mean_fps}")
                     print(f"Suggested number of processes: {n_processes}")
                     print("-" * 100)
-                best_fps.append(mean_fps)
-                most_stable_fps.append(max_stable_fps)
+                safe_configs.append((n_processes, aimed_fps, mean_fps, max_stable_fps))
                 break
             # Decrease the fps to current cap or lower
             aimed_fps = min(round(mean_fps / 10) * 10, aimed_fps - 10)
     print("-" * 100)
-    print("Best config:")
-    print(f"Processes: {sorted(enumerate(most_stable_fps), key=lambda x: x[1])[-1][0]}")
-    print(f"Aimed FPS: {sorted(enumerate(best_fps), key=lambda x: x[1])[-1][1]}")
-    print(
-        f"Most stable FPS: {sorted(enumerate(most_stable_fps), key=lambda x: x[1])[-1][1]}"
-    )
+    if not safe_configs:
+        print("No safe config found.")
+    else:
+        best_processes, best_aimed_fps, best_mean_fps, best_stable_fps = max(
+            safe_configs, key=lambda config: config[3]
+        )
+        print("Best config:")
+        print(f"Processes: {best_processes}")
+        print(f"Aimed FPS: {best_aimed_fps}")
+        print(f"Mean FPS: {best_mean_fps}")
+        print(f"Most stable FPS: {best_stable_fps}")
     print("-" * 100)
 
 
@@ -1,17 +1,84 @@
 """Unit tests for the different recording options of the main.py script."""
 
+import os
+import re
+import shutil
+import subprocess
 import sys
+from multiprocessing.shared_memory import SharedMemory
+
+import pytest
+from PIL import Image
 
 sys.path.append("./")
+import main
+import split_stream
 from main import (
+    DUPLICATE_BASE,
     GamepadRecording,
     KeyboardRecording,
     Manager,
     MouseRecording,
+    SaveStats,
     ScreenRecording,
+    SPSCRing,
     StopRecording,
+    _save,
+    _slot_bytes,
 )
 
+# BGRA pixels of the screenshots written to the slots by the saving tests
+BLUE = bytes([255, 0, 0, 0])
+RED = bytes([0, 0, 255, 0])
+
+
+def save_screenshots(path_output: str, pixels: list[bytes], entries: list[int], **kwargs) -> None:
+    """Run a saving worker in this process on 4x2 screenshots of one color, one slot per screenshot.
+
+    The entries are the ones the grabbing worker would send: number * len(pixels) + slot, or
+    DUPLICATE_BASE - number for a duplicate.
+    """
+    size = (4, 2)
+    slot_bytes = _slot_bytes(size[0] * size[1] * 4)
+    shm = SharedMemory(create=True, size=slot_bytes * len(pixels))
+    try:
+        assert shm.buf is not None
+        for slot, pixel in enumerate(pixels):
+            shm.buf[slot * slot_bytes : slot * slot_bytes + size[0] * size[1] * 4] = pixel * 8
+        queue, free_queue = SPSCRing(len(entries)), SPSCRing(len(entries))
+        for entry in entries:
+            queue.put(entry)
+        queue.close()
+        stats = SaveStats()
+        _save(queue, free_queue, shm, size, stats, path_output, 1, 95, 1, 0, "png", **kwargs)
+        assert stats.done
+    finally:
+        shm.unlink()
+
+
+requires_ffmpeg = pytest.mark.skipif(
+    shutil.which("ffmpeg") is None, reason="ffmpeg is not installed"
+)
+
+
+def count_video_frames(path: str) -> int:
+    """Number of frames of a video, counted by decoding it with ffmpeg."""
+    result = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-i", path, "-map", "0:v:0", "-f", "null", "-"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return int(re.findall(r"frame=\s*(\d+)", result.stderr)[-1])
+
+
+def count_outputs(path_output: str) -> tuple[int, int]:
+    """Number of screenshot files and of timestamps of a recording."""
+    n_files = len([name for name in os.listdir(path_output) if name.startswith("file_")])
+    with open(path_output + "timestamps.txt", encoding="utf-8") as f:
+        n_timestamps = len(f.read().splitlines())
+    return n_files, n_timestamps
+
 
 def test_screen_recording():
     manager = Manager(
@@ -22,6 +89,15 @@ def test_screen_recording():
         print_results=False,
     )
     manager.run_until_stop(timeout=100)
+    assert count_outputs(manager.path_output) == (100, 100)
+
+
+def test_screen_recording_auto_processes():
+    recorder = ScreenRecording(n_processes="auto", aimed_fps=10, max_screenshots=30)
+    manager = Manager([recorder], path_output="./screenshots/test/", print_results=False)
+    manager.run_until_stop(timeout=100)
+    assert isinstance(recorder.n_processes, int) and recorder.n_processes >= 1
+    assert count_outputs(manager.path_output) == (30, 30)
 
 
 def test_screen_recording_webp():
@@ -58,6 +134,128 @@ def test_screen_recording_jpg():
     manager.run_until_stop(timeout=100)
 
 
+def test_screen_recording_stream():
+    manager = Manager(
+        [
+            ScreenRecording(
+                n_processes=3,
+                aimed_fps=10,
+                max_screenshots=30,
+                stream=True,
+            ),
+        ],
+        path_output="./screenshots/test/",
+        print_results=False,
+    )
+    manager.run_until_stop(timeout=100)
+    split_stream.main(manager.path_output, remove=True)
+    assert count_outputs(manager.path_output) == (30, 30)
+    assert not any(name.startswith("stream_") for name in os.listdir(manager.path_output))
+
+
+def test_stream_round_trip(tmp_path):
+    path_output = str(tmp_path) + "/"
+    entries = [0 * 2 + 0, 1 * 2 + 1, DUPLICATE_BASE - 2]
+    save_screenshots(path_output, [BLUE, RED], entries, stream=True)
+    assert split_stream.split_stream(path_output + "stream_0.bin", path_output) == 3
+    colors = [Image.open(path_output + f"file_{frame}.png").getpixel((0, 0)) for frame in range(3)]
+    assert colors == [(0, 0, 255), (255, 0, 0), (255, 0, 0)]
+
+
+def test_screen_recording_pin_cpus():
+    recorder = ScreenRecording(n_processes=2, aimed_fps=10, max_screenshots=30, pin_cpus=True)
+    manager = Manager([recorder], path_output="./screenshots/test/", print_results=False)
+    manager.start()
+    if sys.platform == "linux" and not main.GIL_DISABLED:
+        cpus = main._available_cpus()
+        assert recorder._p_grab is not None and recorder._p_grab.pid is not None
+        assert os.sched_getaffinity(recorder._p_grab.pid) == {cpus[0]}
+        if len(cpus) >= 3:
+            # One CPU for each saving process of one thread, apart from the grabbing one
+            affinities = [os.sched_getaffinity(p_save.pid) for p_save in recorder._p_saves]
+            assert affinities == [{cpus[1]}, {cpus[2]}]
+    manager.stop_event.wait(100)
+    manager.stop()
+    manager.join()
+    assert count_outputs(manager.path_output) == (30, 30)
+
+
+def test_screen_recording_quantize():
+    manager = Manager(
+        [
+            ScreenRecording(
+                n_processes=3,
+                aimed_fps=10,
+                max_screenshots=30,
+                quantize=True,
+            ),
+        ],
+        path_output="./screenshots/test/",
+        print_results=False,
+    )
+    manager.run_until_stop(timeout=100)
+    assert count_outputs(manager.path_output) == (30, 30)
+    assert Image.open(manager.path_output + "file_0.png").mode == "P"
+
+
+def test_screen_recording_webp_method():
+    manager = Manager(
+        [
+            ScreenRecording(
+                n_processes=3,
+                aimed_fps=10,
+                max_screenshots=30,
+                format_image="webp",
+                webp_method=6,
+            ),
+        ],
+        path_output="./screenshots/test/",
+        print_results=False,
+    )
+    manager.run_until_stop(timeout=100)
+    assert count_outputs(manager.path_output) == (30, 30)
+    assert os.path.exists(manager.path_output + "file_29.webp")
+
+
+@requires_ffmpeg
+def test_screen_recording_mp4():
+    manager = Manager(
+        [
+            ScreenRecording(
+                n_processes=1,
+                aimed_fps=10,
+                max_screenshots=30,
+                format_image="mp4",
+            ),
+        ],
+        path_output="./screenshots/test/",
+        print_results=False,
+    )
+    manager.run_until_stop(timeout=100)
+    assert count_outputs(manager.path_output) == (0, 30)
+    assert count_video_frames(manager.path_output + "video.mp4") == 30
+
+
+@requires_ffmpeg
+def test_screen_recording_mp4_video_codec():
+    manager = Manager(
+        [
+            ScreenRecording(
+                n_processes=1,
+                aimed_fps=10,
+                max_screenshots=30,
+                format_image="mp4",
+                video_codec="libx264",
+            ),
+        ],
+        path_output="./screenshots/test/",
+        print_results=False,
+    )
+    manager.run_until_stop(timeout=100)
+    assert count_outputs(manager.path_output) == (0, 30)
+    assert count_video_frames(manager.path_output + "video.mp4") == 30
+
+
 def test_screen_recording_downsample():
     manager = Manager(
         [
@@ -76,6 +274,111 @@ def test_screen_recording_downsample():
     manager.run_until_stop(timeout=100)
 
 
+def test_screen_recording_threads():
+    manager = Manager(
+        [
+            ScreenRecording(
+                n_processes=2,
+                n_threads=3,
+                aimed_fps=10,
+                compression_rate=6,
+                max_screenshots=30,
+            ),
+        ],
+        path_output="./screenshots/test/",
+        print_results=False,
+    )
+    manager.run_until_stop(timeout=100)
+    assert count_outputs(manager.path_output) == (30, 30)
+
+
+def test_screen_recording_deduplicate():
+    manager = Manager(
+        [
+            ScreenRecording(
+                n_processes=2,
+                aimed_fps=10,
+                max_screenshots=30,
+                deduplicate=True,
+            ),
+        ],
+        path_output="./screenshots/test/",
+        print_results=False,
+    )
+    manager.run_until_stop(timeout=100)
+    assert count_outputs(manager.path_output) == (30, 30)
+
+
+def test_deduplicate_hard_links(tmp_path):
+    path_output = str(tmp_path) + "/"
+    entries = [0 * 2 + 0, 1 * 2 + 1, DUPLICATE_BASE - 2, DUPLICATE_BASE - 3]
+    save_screenshots(path_output, [BLUE, RED], entries)
+    inodes = [os.stat(path_output + f"file_{frame}.png").st_ino for frame in range(4)]
+    assert inodes[0] != inodes[1] and inodes[1] == inodes[2] == inodes[3]
+    assert Image.open(path_output + "file_3.png").getpixel((0, 0)) == (255, 0, 0)
+
+
+def test_deduplicate_after_failed_write(tmp_path, monkeypatch):
+    write_file = main._write_file
+
+    def fail_second_screenshot(path: str, parts: list[bytes]) -> None:
+        if path.endswith("file_1.png"):
+            raise OSError("disk full")
+        write_file(path, parts)
+
+    monkeypatch.setattr(main, "_write_file", fail_second_screenshot)
+    path_output = str(tmp_path) + "/"
+    # Screenshot 0 is blue, screenshot 1 is red and fails to be written, screenshot 2 is a duplicate of 1
+    entries = [0 * 2 + 0, 1 * 2 + 1, DUPLICATE_BASE - 2]
+    with pytest.warns(UserWarning, match="failed to write"):
+        save_screenshots(path_output, [BLUE, RED], entries)
+    assert not os.path.exists(path_output + "file_1.png")
+    # The duplicate is written again rather than linked to the blue screenshot
+    assert Image.open(path_output + "file_2.png").getpixel((0, 0)) == (255, 0, 0)
+    assert os.stat(path_output + "file_2.png").st_ino != os.stat(path_output + "file_0.png").st_ino
+
+
+def test_screen_recording_mss_backend():
+    manager = Manager(
+        [
+            ScreenRecording(
+                n_processes=3,
+                aimed_fps=10,
+                max_screenshots=30,
+                backend="mss",
+            ),
+        ],
+        path_output="./screenshots/test/",
+        print_results=False,
+    )
+    manager.run_until_stop(timeout=100)
+    assert count_outputs(manager.path_output) == (30, 30)
+
+
+def test_screen_recording_drop_on_backpressure(tmp_path):
+    # The slowest WEBP encoding and 2 slots: the saving process can't keep up with 30 FPS
+    recorder = ScreenRecording(
+        n_processes=1,
+        aimed_fps=30,
+        quality=100,
+        max_screenshots=60,
+        allowed_n_images_delayed=2,
+        drop_on_backpressure=True,
+        format_image="webp",
+        webp_method=6,
+    )
+    path_output = str(tmp_path) + "/"
+    recorder.set_common_parameters(path_output=path_output, print_results=False)
+    recorder.start()
+    recorder.stop_event.wait(100)
+    recorder.stop()
+    grab_log, _ = recorder.join()
+    assert grab_log["dropped"] > 0
+    # Dropped screenshots take no number: the files and the timestamps stay contiguous
+    n_saved = 60 - grab_log["dropped"]
+    assert count_outputs(path_output) == (n_saved, n_saved)
+
+
 def test_input_recording():
     manager = Manager(
         [
@@ -1,112 +1,145 @@
+import argparse
 import os
 import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
 from threading import Thread
 
 import mss
 from PIL import Image
 
+# Pillow format, option set by the level and the levels to test, for each extension
+FORMATS = {
+    "jpg": ("JPEG", "quality", range(5, 100, 10)),
+    "png": ("PNG", "compress_level", range(0, 10)),
+    "webp": ("WEBP", "quality", range(5, 100, 10)),
+}
+DOWNSAMPLES = [1, 2, 4]
+# Level saved for each extension with --single-save: the defaults of the screen recording
+DEFAULT_LEVELS = {"jpg": 95, "png": 1, "webp": 95}
 
-def measure_fps() -> None:
-    """Measure the FPS of the screen recording."""
-    sct = mss.mss()
-    monitor_id = 1
-    monitor = sct.monitors[monitor_id]
-    mon = {
-        "top": monitor["top"],
-        "left": monitor["left"],
-        "width": monitor["width"],
-        "height": monitor["height"],
-    }
 
-    fps = 0
-    last_time = time.time()
+def encode_one(
+    shm_name: str, size: tuple[int, int], extension: str, level: int, downsample: int
+) -> tuple[str, int, int, float, float]:
+    """Save the screenshot of the shared memory with one setting. Return the setting, the file size in MB and the time to save."""
+    shm = SharedMemory(name=shm_name)
+    try:
+        start = time.time()
+        assert shm.buf is not None, "Shared memory is open."
+        img_thumbnail = Image.frombuffer("RGB", size, shm.buf, "raw", "RGB", 0, 1)  # type: ignore[arg-type]
+        img_thumbnail.thumbnail(
+            (size[0] // downsample, size[1] // downsample), Image.Resampling.LANCZOS
+        )
+        path = f"test_small_{extension}_{level}_{downsample}.{extension}"
+        pil_format, option, _ = FORMATS[extension]
+        img_thumbnail.save(path, pil_format, **{option: level})
+        duration = time.time() - start
+        file_size = os.path.getsize(path) / 1024 / 1024
+        os.remove(path)
+    finally:
+        shm.close()
+    return extension, level, downsample, file_size, duration
 
-    while time.time() - last_time < 10:
-        img = sct.grab(mon)
-        fps += 1
-    print(fps / 10)
-    # Check time to save different formats with different quality and downsample
-    times = []
-    # JPG
-    for quality in range(5, 100, 10):
-        for downsample in [1, 2, 4]:
-            start = time.time()
-            img_thumbnail = Image.frombytes("RGB", img.size, img.rgb)
-            img_thumbnail.thumbnail(
-                (img.size[0] // downsample, img.size[1] // downsample), Image.Resampling.LANCZOS
-            )
-            img_thumbnail.save("test_small.jpg", "JPEG", quality=quality)
-            times.append(time.time() - start)
-            print(
-                "Quality: ",
-                quality,
-                "Downsample: ",
-                downsample,
-                "File size: ",
-                round(os.path.getsize("test_small.jpg") / 1024 / 1024, 3),
-                "MB",
-                "Time to save: ",
-                round(time.time() - start, 3),
-                "s",
-            )
-    print("-" * 100)
-    print("Mean time to save JPG: ", sum(times) / len(times))
-    print("-" * 100)
-    # PNG
-    times = []
-    for compression_rate in range(0, 10):
-        for downsample in [1, 2, 4]:
-            start = time.time()
-            img_thumbnail = Image.frombytes("RGB", img.size, img.rgb)
-            img_thumbnail.thumbnail(
-                (img.size[0] // downsample, img.size[1] // downsample), Image.Resampling.LANCZOS
-            )
-            img_thumbnail.save("test_small.png", "PNG", compress_level=compression_rate)
-            times.append(time.time() - start)
-            print(
-                "Compression rate: ",
-                compression_rate,
-                "Downsample: ",
-                downsample,
-                "File size: ",
-                round(os.path.getsize("test_small.png") / 1024 / 1024, 3),
-                "MB",
-                "Time to save: ",
-                round(time.time() - start, 3),
-                "s",
-            )
-    print("-" * 100)
-    print("Mean time to save PNG: ", sum(times) / len(times))
-    print("-" * 100)
-    # WEBP
-    times = []
-    for quality in range(5, 100, 10):
-        for downsample in [1, 2, 4]:
-            start = time.time()
-            img_thumbnail = Image.frombytes("RGB", img.size, img.rgb)
-            img_thumbnail.thumbnail(
-                (img.size[0] // downsample, img.size[1] // downsample), Image.Resampling.LANCZOS
-            )
-            img_thumbnail.save("test_small.webp", "WEBP", quality=quality)
-            times.append(time.time() - start)
-            print(
-                "Quality: ",
-                quality,
-                "Downsample: ",
-                downsample,
-                "File size: ",
-                round(os.path.getsize("test_small.webp") / 1024 / 1024, 3),
-                " MB",
-                "Time to save: ",
-                round(time.time() - start, 3),
-                " s",
-            )
+
+def pareto_front(
+    results: list[tuple[str, int, int, float, float]],
+) -> list[tuple[str, int, int, float, float]]:
+    """Keep the settings for which no other setting is both smaller and faster, sorted by time to save."""
+    front: list[tuple[str, int, int, float, float]] = []
+    for result in sorted(results, key=lambda result: (result[4], result[3])):
+        if not front or result[3] < front[-1][3]:
+            front.append(result)
+    return front
+
+
+def measure_fps(
+    duration: float = 10,
+    codecs: tuple[str, ...] = ("png", "webp", "jpg"),
+    do_encode: bool = True,
+    single_save: bool = False,
+) -> None:
+    """Measure the FPS of the screen recording.
+
+    Args:
+        duration (float): Time in seconds spent grabbing screenshots to measure the FPS.
+        codecs (tuple[str, ...]): Formats to measure the time to save of.
+        do_encode (bool): Whether to measure the time to save the screenshots or only the grabbing FPS.
+        single_save (bool): Save one screenshot per format with the defaults of the screen recording
+            instead of trying every level and downsample.
+    """
+    monitor_id = 1
+    fps = 0
+    # The context manager releases the display handles once the grabbing is measured
+    with mss.mss() as sct:
+        monitor = sct.monitors[monitor_id]
+        mon = {
+            "top": monitor["top"],
+            "left": monitor["left"],
+            "width": monitor["width"],
+            "height": monitor["height"],
+        }
+        last_time = time.time()
+        while time.time() - last_time < duration:
+            img = sct.grab(mon)
+            fps += 1
+    print(fps / duration)
+    if not do_encode:
+        return
+    # Check time to save different formats with different quality and downsample.
+    # The settings are independent: they are saved in parallel, from one copy of the screenshot in
+    # shared memory, with fewer processes than cores. The processes still share the memory
+    # bandwidth and caches: the times are those of a loaded machine, like during a recording,
+    # rather than of one setting alone.
+    rgb = img.rgb
+    shm = SharedMemory(create=True, size=len(rgb))
+    try:
+        assert shm.buf is not None, "Shared memory is open."
+        shm.buf[: len(rgb)] = rgb
+        if single_save:
+            settings = [(shm.name, img.size, codec, DEFAULT_LEVELS[codec], 1) for codec in codecs]
+        else:
+            settings = [
+                (shm.name, img.size, codec, level, downsample)
+                for codec in codecs
+                for level in FORMATS[codec][2]
+                for downsample in DOWNSAMPLES
+            ]
+        with ProcessPoolExecutor(max_workers=max(1, (os.cpu_count() or 1) - 1)) as executor:
+            results = list(executor.map(encode_one, *zip(*settings)))
+    finally:
+        shm.close()
+        shm.unlink()
+    for extension in codecs:
+        times = [result[4] for result in results if result[0] == extension]
+        print("-" * 100)
+        print(f"Mean time to save {extension.upper()} under load: ", sum(times) / len(times))
     print("-" * 100)
-    print("Mean time to save WEBP: ", sum(times) / len(times))
+    print("Settings for which no other is both smaller and faster (times measured under load):")
+    for extension, level, downsample, file_size, encode_time in pareto_front(results):
+        print(
+            f"Format: {extension}, Level: {level}, Downsample: {downsample}, "
+            + f"File size: {round(file_size, 3)} MB, Time to save under load: {round(encode_time, 3)} s"
+        )
     print("-" * 100)
 
 
 if __name__ == "__main__":
-    thread = Thread(target=measure_fps)
+    parser = argparse.ArgumentParser(description="Measure the grabbing FPS and the time to save.")
+    parser.add_argument("--duration", type=float, default=10, help="Grabbing time in seconds.")
+    parser.add_argument(
+        "--codecs", nargs="+", choices=list(FORMATS), default=["png", "webp", "jpg"]
+    )
+    parser.add_argument("--no-encode", action="store_true", help="Only measure the grabbing FPS.")
+    parser.add_argument(
+        "--single-save",
+        action="store_true",
+        help="Save one screenshot per format with the defaults of the screen recording.",
+    )
+    args = parser.parse_args()
+    thread = Thread(
+        target=measure_fps,
+        args=(args.duration, tuple(args.codecs), not args.no_encode, args.single_save),
+    )
     thread.start()
     thread.join()